@@ -1,11 +1,25 @@
 from PyQt6.QtCore import QAbstractListModel, QModelIndex, QVariant, QAbstractItemModel, QStringListModel, pyqtSignal, \
-    QObject
+    QObject, QTimer, Qt
 from PyQt6.QtWidgets import QListView, QPushButton, QDialog, QVBoxLayout, QLabel
 
+from bship_anytime import AnytimeBShipGame
 from bship_board_factory import BoardFactory
-from bship_game import BShipGame
+from bship_candidates import CandidateBrowser, board_text
+from bship_checkpoint import (CHECKPOINT_DIR, CHECKPOINT_STAGGER, checkpoint_path_for, discard_checkpoint,
+                              experiment_key, load_checkpoint, save_checkpoint)
+from bship_experiment import EXPERIMENT_SEED, ComparativeExperiment, play_board
+from bship_factory_cache import FACTORY_CACHE_SIZE, FactoryCache
+from bship_game import board_seed
+from bship_hunt_target import HUNT_TARGET, HuntTargetGame
+from bship_monte_carlo import BoardSampler
+from bship_par import PAR_STRATEGY, ParTable
+from bship_results import ResultsCollector
+from bship_sampling import PRECISION_DEFAULT, SequentialSampler
+from bship_trace import TRACE_PATH_DEFAULT, TraceWriter
 
 import threading
+from collections import OrderedDict
+from random import Random
 from time import perf_counter
 
 HEIGHT_DEFAULT = 5
@@ -14,13 +28,29 @@ SHIPS_DEFAULT = ["3","4", "5"]
 
 UI_UPDATE_STAGGER = 10
 
+# Seconds of belief computation per interactive guess; the rest happens while the UI is idle
+INTERACTIVE_MOVE_BUDGET = 0.05
+
+# Boards drawn for strategies which need no enumeration (HuntTarget)
+SAMPLED_BOARDS = 1000
+
+# Strategies run side by side by the "Compare" option: PMax, PMed, PMin, Rand
+COMPARE_STRATEGIES = (1, 0, 4, 2)
+
+# Par tables kept (least recently used dropped), as many as the factories the cache keeps
+PAR_TABLES_SIZE = FACTORY_CACHE_SIZE
+
 
 class ExperimentThread(threading.Thread):
 
     def __init__(self, bf, strat,
                  hit_signal, miss_signal,
                  experiment_complete_signal, experiment_aborted_signal,
-                 experiment_rerender_signal, experiment_update_signal):
+                 experiment_rerender_signal, experiment_update_signal,
+                 results_path=None, checkpoint_dir=None,
+                 sampler=None, experiment_estimate_signal=None,
+                 comparison=None, board_sampler=None, n_sampled=0, trace_path=None, seed=EXPERIMENT_SEED,
+                 par_table=None):
         super().__init__()
         self._stop_event = threading.Event()
         self._stop_showing_event = threading.Event()
@@ -32,6 +62,27 @@ class ExperimentThread(threading.Thread):
         self.exp_aborted_signal = experiment_aborted_signal
         self.exp_rerender_signal = experiment_rerender_signal
         self.exp_update_progress_signal = experiment_update_signal
+        # running statistics, optionally with per-board records written to results_path
+        self.results_path = results_path
+        self.results = None
+        # progress is periodically saved here so the experiment can be resumed
+        self.checkpoint_path = checkpoint_path_for(checkpoint_dir, bf, strat) if checkpoint_dir and bf else None
+        # if given, play randomly drawn boards until the sampler is satisfied instead of every board
+        self.sampler = sampler
+        self.exp_estimate_signal = experiment_estimate_signal
+        # if given, a ComparativeExperiment which plays several strategies on each board
+        self.comparison = comparison
+        # with no factory (bf is None), play n_sampled boards drawn by a BoardSampler instead
+        self.board_sampler = board_sampler
+        self.n_sampled = n_sampled
+        # if given, every guess is recorded to this trace file for later replay
+        self.trace_path = trace_path
+        self.trace = None
+        self.game_events = []
+        # each board's game is seeded from this, so reruns (and resumed runs) are reproducible
+        self.seed = seed
+        # if given, a ParTable for this factory and strategy, filled in as boards are played
+        self.par_table = par_table
 
     def stop(self):
         """
@@ -54,55 +105,249 @@ class ExperimentThread(threading.Thread):
         self.exp_rerender_signal.emit()
 
     def run(self):
-        self.run_exp()
+        if self.bf is None:
+            self.run_sampled_boards()
+        elif self.comparison:
+            self.run_compare()
+        elif self.sampler:
+            self.run_sampled()
+        else:
+            self.run_exp()
 
     def run_exp(self):
         """
         Runs the experiment with the given parameters
         """
-        scores = []
-        i = 0
+        start = self.restore_checkpoint()
+        results = self.results
+        self.open_trace(append=start > 0)
+        if start:
+            self.exp_update_progress_signal.emit(start)
+
         # Creates a game for each board and run the default strategy
-        for board in self.bf.default_boards:
-            # Note we use the same BoardFactory for every game because caching boost
-            bg = BShipGame(board, self.bf, self.strat)
-            exp_score = 0
-            i += 1
-            # Conditions, either using random strategy and all-sunk win conditions,
-            # or using belief-based strategy and IL win conditions.
-            while (self.strat == 3 and not bg.detect_hit_win()) or (self.strat != 3 and not bg.detect_il_win()):
+        for i in range(start, len(self.bf.default_boards)):
+            bg = play_board(self.bf, self.bf.default_boards[i], self.strat, self.show_guess,
+                            seed=board_seed(self.seed, i))
+            results.add(i, bg.guesses, bg.achieved_hits)
+            self.record_game(i)
+            if self.par_table:
+                self.par_table.record(i, bg.guesses)
+
+            if not (self._stop_showing_event.is_set()):
+                self.exp_rerender_signal.emit()
+
+            # Staggered output to not overwhelm event loop and slow down UI responsiveness
+            if (i + 1) % UI_UPDATE_STAGGER == 0:
+                self.exp_update_progress_signal.emit(i + 1)
+
+            if self._stop_event.is_set():
+                # keep the partial run, so it can be resumed with the same parameters
+                self.save_checkpoint(i + 1)
+                break
+
+            if (i + 1) % CHECKPOINT_STAGGER == 0:
+                self.save_checkpoint(i + 1)
+
+        results.close()
+        self.close_trace()
+        if results.n == 0:
+            # exp failed
+            return
+
+        if self._stop_event.is_set():
+            self.exp_aborted_signal.emit()
+        else:
+            if self.checkpoint_path:
+                discard_checkpoint(self.checkpoint_path)
+            self.exp_complete_signal.emit(results.mean, results.max_score)
+
+    def run_sampled_boards(self):
+        """
+        Runs a strategy which needs no BoardFactory (HuntTarget) against randomly drawn boards
+        """
+        sampler = self.board_sampler
+        self.results = ResultsCollector(self.results_path)
+        self.open_trace()
+        for i in range(self.n_sampled):
+            bg = HuntTargetGame(sampler.random_board(), sampler.w, sampler.h, sampler.shipdescr,
+                                board_seed(self.seed, i))
+            while not bg.detect_hit_win():
                 g = bg.get_best_guess()
-                exp_score += 1
-                hit_succ = bg.real_hit(g)
+                self.show_guess(g, bg.real_hit(g))
+            self.results.add(i, bg.guesses, bg.achieved_hits)
+            self.record_game(i)
 
-                # Display guesses live, in the main thread
-                if not (self._stop_showing_event.is_set()):
-                    if hit_succ:
-                        self.hit_signal.emit(g)
-                    else:
-                        self.miss_signal.emit(g)
+            if not (self._stop_showing_event.is_set()):
+                self.exp_rerender_signal.emit()
 
-            scores.append(exp_score)
+            if (i + 1) % UI_UPDATE_STAGGER == 0:
+                self.exp_update_progress_signal.emit(i + 1)
+
+            if self._stop_event.is_set():
+                break
+
+        self.results.close()
+        self.close_trace()
+        if self.results.n == 0:
+            return
+
+        if self._stop_event.is_set():
+            self.exp_aborted_signal.emit()
+        else:
+            self.exp_complete_signal.emit(self.results.mean, self.results.max_score)
+
+    def run_compare(self):
+        """
+        Runs every strategy of the comparison against each board in one pass
+        """
+        comparison = self.comparison
+        # the first strategy's statistics stand in for the experiment's headline results
+        self.results = comparison.results[comparison.strats[0]]
+        for i in range(len(self.bf.default_boards)):
+            comparison.play(i, self.show_guess)
 
             if not (self._stop_showing_event.is_set()):
                 self.exp_rerender_signal.emit()
 
-            # Staggered output to not overwhelm event loop and slow down UI responsiveness
-            if i % UI_UPDATE_STAGGER == 0:
-                self.exp_update_progress_signal.emit(i)
+            if (i + 1) % UI_UPDATE_STAGGER == 0:
+                self.exp_update_progress_signal.emit(i + 1)
 
             if self._stop_event.is_set():
                 break
 
-        if len(scores) == 0:
-            # exp failed
+        if self.results.n == 0:
             return
-        avgscore = sum(scores) / len(scores)
 
         if self._stop_event.is_set():
             self.exp_aborted_signal.emit()
         else:
-            self.exp_complete_signal.emit(avgscore, max(scores))
+            self.exp_complete_signal.emit(self.results.mean, self.results.max_score)
+
+    def run_sampled(self):
+        """
+        Runs the experiment on random boards, reporting the mean with a confidence interval
+            as it goes, until the target precision is reached
+        """
+        sampler = self.sampler
+        self.results = sampler.results
+        self.open_trace()
+        while not sampler.done():
+            self.record_game(sampler.step(self.show_guess))
+            n = sampler.results.n
+
+            if not (self._stop_showing_event.is_set()):
+                self.exp_rerender_signal.emit()
+
+            if n % UI_UPDATE_STAGGER == 0:
+                self.exp_update_progress_signal.emit(n)
+                self.exp_estimate_signal.emit(sampler.results.mean, sampler.half_width())
+
+            if self._stop_event.is_set():
+                break
+
+        self.close_trace()
+        if self.results.n == 0:
+            return
+
+        self.exp_estimate_signal.emit(self.results.mean, sampler.half_width())
+        if self._stop_event.is_set():
+            self.exp_aborted_signal.emit()
+        else:
+            self.exp_complete_signal.emit(self.results.mean, self.results.max_score)
+
+    def restore_checkpoint(self) -> int:
+        """
+        Resume from the last checkpoint of this experiment if there is one
+        Returns the index of the first board still to be played.
+        """
+        state = None
+        if self.checkpoint_path:
+            state = load_checkpoint(self.checkpoint_path, experiment_key(self.bf, self.strat, self.seed))
+        if state is not None:
+            state["results"].path = self.results_path
+            try:
+                state["results"].reopen()
+            except ValueError as e:
+                print("Ignoring checkpoint:", e)
+                state = None
+        if state is None:
+            self.results = ResultsCollector(self.results_path)
+            return 0
+
+        print("Resuming experiment from board", state["cursor"])
+        self.results = state["results"]
+        self.bf.cache.merge_miss_cache(state["miss_cache"])
+        return state["cursor"]
+
+    def save_checkpoint(self, cursor: int) -> None:
+        if self.checkpoint_path:
+            save_checkpoint(self.checkpoint_path, experiment_key(self.bf, self.strat, self.seed),
+                            cursor, self.results, self.bf.cache.snapshot_miss_cache())
+
+    def open_trace(self, append: bool = False) -> None:
+        if self.trace_path:
+            self.trace = TraceWriter(self.trace_path, append)
+
+    def record_game(self, board_index: int) -> None:
+        """
+        Write the guesses of the game just played to the trace
+        """
+        if self.trace:
+            self.trace.record_game(board_index, self.game_events)
+        self.game_events = []
+
+    def close_trace(self) -> None:
+        if self.trace:
+            self.trace.close()
+
+    def show_guess(self, g, hit_succ):
+        """
+        Display guesses live, in the main thread, and collect them for the trace
+        """
+        if self.trace:
+            self.game_events.append((g, hit_succ))
+        if not (self._stop_showing_event.is_set()):
+            if hit_succ:
+                self.hit_signal.emit(g)
+            else:
+                self.miss_signal.emit(g)
+
+
+class CandidateListModel(QAbstractListModel):
+    """
+    The boards still consistent with the interactive game, for the "visualise" view
+    Rows are fetched from a CandidateBrowser a page at a time as the view scrolls (Qt calls
+        canFetchMore()/fetchMore()), so only what has been scrolled to is ever loaded.
+    """
+
+    def __init__(self, browser: CandidateBrowser, w: int, h: int):
+        super().__init__()
+        self.browser = browser
+        self.w = w
+        self.h = h
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.browser.can_fetch_more()
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        page = self.browser.fetch()
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows += page
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return QVariant()
+        i, board = self.rows[index.row()]
+        return f"Board {i}\n" + board_text(board, self.w, self.h)
 
 
 class BShipModel(QObject):
@@ -120,6 +365,7 @@ class BShipModel(QObject):
     experiment_aborted_signal = pyqtSignal()
     experiment_score_signal = pyqtSignal(int)
     experiment_update_signal = pyqtSignal(int)
+    experiment_estimate_signal = pyqtSignal(float, float)
 
     def __init__(self):
         super().__init__()
@@ -130,6 +376,8 @@ class BShipModel(QObject):
 
         self.width = WIDTH_DEFAULT
         self.height = HEIGHT_DEFAULT
+        # ships may not touch, even diagonally
+        self.no_touch = False
 
         self.par = 0
         self.score = 0
@@ -137,7 +385,7 @@ class BShipModel(QObject):
         self.current_tab = 0
 
         self.strategies = QStringListModel()
-        self.strategies_list = ["PMax", "PMed", "PMin", "Rand", "RandFast"]
+        self.strategies_list = ["PMax", "PMed", "PMin", "Rand", "RandFast", "HuntTarget", "Compare"]
         self.strategies.setStringList(self.strategies_list)
         self.strategy = "PMax"
 
@@ -151,11 +399,28 @@ class BShipModel(QObject):
         self.bf = None
         self.exp = None
 
+        # built factories survive resets, so tweak-and-rerun cycles don't re-enumerate
+        self.factory_cache = FactoryCache()
+        # par scores of recent factories' boards, keyed by (w, h, fleet, no_touch)
+        self.par_tables = OrderedDict()
+
         self.boards_n = 0
 
         self.exp_start_time = 0
         self.exp_complete_time = 0
 
+        # set to a file path to keep per-board experiment records on disk
+        self.results_path = None
+        # experiments checkpoint here and resume if interrupted; None disables checkpointing
+        self.checkpoint_dir = CHECKPOINT_DIR
+
+        # set to a file path to record every guess of an experiment, for replay
+        self.trace_path = None
+
+        # sampled experiments stop once the mean is known to +/- sample_precision
+        self.sample_experiment = False
+        self.sample_precision = PRECISION_DEFAULT
+
         self.experiment_complete_signal.connect(self.on_experiment_complete)
 
     def on_add_ship(self):
@@ -190,6 +455,12 @@ class BShipModel(QObject):
         if self.bg:
             self.reset_game()
 
+    def on_no_touch_changed(self, value: bool):
+        print("No touching bool changed to ", value)
+        self.no_touch = bool(value)
+        if self.bg:
+            self.reset_game()
+
     def on_show_heat_changed(self, new_sh):
         print("Heatmap bool changed to ", new_sh)
         self.show_heatmap = new_sh
@@ -198,6 +469,14 @@ class BShipModel(QObject):
         print("Vis bool changed to ", new_vs)
         self.show_visualise = new_vs
 
+    def on_sample_changed(self, value: bool):
+        print("Sample bool changed to ", value)
+        self.sample_experiment = value
+
+    def on_record_changed(self, value: bool):
+        print("Record bool changed to ", value)
+        self.trace_path = TRACE_PATH_DEFAULT if value else None
+
     def on_stop_pressed(self):
         print("Stop pressed")
 
@@ -224,6 +503,11 @@ class BShipModel(QObject):
             return 3
         elif text_strat == "PMin":
             return 4
+        elif text_strat == "HuntTarget":
+            return HUNT_TARGET
+        elif text_strat == "Compare":
+            # not a strategy: runs COMPARE_STRATEGIES side by side
+            return None
 
     def on_go_pressed(self):
 
@@ -239,26 +523,51 @@ class BShipModel(QObject):
             if self.current_tab == 0:
 
                 self.widgets["InteractiveGamebox"].on_game_started()
-                self.bf = BoardFactory(self.width, self.height, tuple(int(i) for i in self.ships.stringList()))
-                self.bg = BShipGame(self.bf.get_random_board(), self.bf, self.translate_strategy(self.strategy))
-                bgp = BShipGame(self.bg.ships, self.bf, 0)
+                self.bf = self.get_factory()
+                strat = self.translate_strategy(self.strategy)
+                # "Compare" is not a strategy of its own; interactive games fall back to PMed
+                board_index = self.bf.get_random_board_index()
+                self.bg = AnytimeBShipGame(self.bf.default_boards[board_index], self.bf,
+                                           0 if strat is None else strat, INTERACTIVE_MOVE_BUDGET)
                 self.score = 0
-                self.par = bgp.autoplay()
+                self.par = self.get_par_table(self.bf).par(board_index)
                 self.int_game_created_success.emit()
 
             if self.current_tab == 1:
                 self.widgets["ExperimentsGamebox"].on_game_started()
-                bf = BoardFactory(self.width, self.height, tuple(int(i) for i in self.ships.stringList()))
                 strat = self.translate_strategy(self.strategy)
 
+                sampler = None
+                comparison = None
+                board_sampler = None
+                if strat == HUNT_TARGET:
+                    # needs no enumeration, so it plays sampled boards of any size
+                    bf = None
+                    board_sampler = BoardSampler(self.width, self.height,
+                                                 tuple(int(i) for i in self.ships.stringList()),
+                                                 Random(EXPERIMENT_SEED), self.no_touch)
+                else:
+                    bf = self.get_factory()
+
+                if strat is None:
+                    comparison = ComparativeExperiment(bf, COMPARE_STRATEGIES)
+                elif self.sample_experiment and bf:
+                    sampler = SequentialSampler(bf, strat, self.sample_precision, seed=EXPERIMENT_SEED)
+
                 self.exp = ExperimentThread(bf, strat, self.hit_signal, self.miss_signal,
                                             self.experiment_complete_signal, self.experiment_aborted_signal,
-                                            self.experiment_rerender_signal, self.experiment_update_signal)
+                                            self.experiment_rerender_signal, self.experiment_update_signal,
+                                            self.results_path, self.checkpoint_dir,
+                                            sampler, self.experiment_estimate_signal,
+                                            comparison, board_sampler, SAMPLED_BOARDS,
+                                            None if comparison else self.trace_path,
+                                            par_table=self.get_par_table(bf, background=False)
+                                            if bf and strat == PAR_STRATEGY else None)
 
                 if not self.show_board:
                     self.exp.stop_showing()
                 self.exp.start()
-                self.boards_n = len(bf.default_boards)
+                self.boards_n = len(bf.default_boards) if bf else SAMPLED_BOARDS
                 self.experiment_started_signal.emit(self.boards_n)
                 self.exp_start_time = perf_counter()
                 if not self.show_board:
@@ -268,6 +577,39 @@ class BShipModel(QObject):
             print("Encountered an error, board is badly set up?")
             self.reset_game()
 
+    def get_factory(self) -> BoardFactory:
+        """
+        Fetch (or build) the factory for the current board parameters
+        """
+        return self.factory_cache.get(self.width, self.height, tuple(int(i) for i in self.ships.stringList()),
+                                      self.no_touch)
+
+    def get_par_table(self, bf: BoardFactory, background: bool = True) -> ParTable:
+        """
+        The par table of a factory, created on first use and filled in the background
+            (unless an experiment is about to fill it anyway)
+        Only this table keeps filling: the others are stopped so they don't compete with the
+            current game, and tables beyond PAR_TABLES_SIZE are dropped with their factories.
+        """
+        key = (bf.w, bf.h, tuple(bf.shipdescr), bf.no_touch)
+        table = self.par_tables.get(key)
+        if table is None or table.bf is not bf:
+            if table is not None:
+                table.stop()
+            table = ParTable(bf)
+            self.par_tables[key] = table
+        self.par_tables.move_to_end(key)
+        for other in self.par_tables.values():
+            if other is not table:
+                other.stop()
+        while len(self.par_tables) > PAR_TABLES_SIZE:
+            self.par_tables.popitem(last=False)
+        if background and not table.complete():
+            table.fill_in_background()
+        elif not background:
+            table.stop()
+        return table
+
     def on_experiment_complete(self):
         self.exp_complete_time = perf_counter()
         self.reset_game()
@@ -309,6 +651,25 @@ class BShipModel(QObject):
         if self.bg.detect_il_win():
             self.win_signal.emit()
             self.reset_game()
+        else:
+            QTimer.singleShot(0, self.refine_beliefs)
+
+    def candidate_browser(self):
+        """
+        A CandidateBrowser over the interactive game's remaining boards, or None if no game is on
+        """
+        if not isinstance(self.bg, AnytimeBShipGame):
+            return None
+        return CandidateBrowser(self.bg)
+
+    def refine_beliefs(self):
+        """
+        Make the interactive game's estimated probabilities exact, a slice at a time between events
+        """
+        if not isinstance(self.bg, AnytimeBShipGame):
+            return
+        if not self.bg.refine(INTERACTIVE_MOVE_BUDGET):
+            QTimer.singleShot(0, self.refine_beliefs)
 
 
 
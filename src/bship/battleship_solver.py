@@ -1,22 +1,27 @@
 
 import sys
 import math
+import os
 
-from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QTabWidget, QWidget, QHBoxLayout,
                              QVBoxLayout, QGridLayout, QLabel, QScrollArea, QLineEdit, QSpinBox, QCheckBox, QFrame,
                              QToolBar, QColumnView, QProgressBar, QComboBox, QListWidget, QListView, QAbstractItemView,
                              QDialog)
 
-from battleship_model import BShipModel
+from battleship_model import BShipModel, CandidateListModel
+from bship_candidates import board_text
 from bship_game import BShipGame
+from bship_trace import TRACE_PATH_DEFAULT, TraceReader
 
 model = BShipModel()
 HEIGHT_DEFAULT = 5
 WIDTH_DEFAULT = 5
 INTERACTIVE_INDEX = 0
 EXPERIMENTS_INDEX = 1
+# Milliseconds between guesses when replaying a recorded game
+REPLAY_INTERVAL_DEFAULT = 200
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -55,12 +60,25 @@ class MainWindow(QMainWindow):
         diag = QDialog()
         diag.setLayout(QVBoxLayout())
         diag.layout().addWidget(QLabel("Experiment complete!"))
-        diag.layout().addWidget(QLabel("Number of tests = "+f'{model.boards_n:d}'))
+        results = model.exp.results
+        diag.layout().addWidget(QLabel("Number of tests = "+f'{results.n:d}'))
         diag.layout().addWidget(QLabel("Average score = "+f'{avgscore:.2f}'))
+        if model.exp.sampler:
+            diag.layout().addWidget(QLabel("Confidence interval = "+f'+/- {model.exp.sampler.half_width():.3f}'))
         diag.layout().addWidget(QLabel("Maximum score = "+f'{maxscore:.2f}'))
 
+        diag.layout().addWidget(QLabel("Std. deviation = "+f'{results.std():.2f}'))
+        diag.layout().addWidget(QLabel("Median / 90th percentile = "
+                                       +f'{results.percentile(50):d} / {results.percentile(90):d}'))
+        diag.layout().addWidget(QLabel("Worst board = "+f'{results.worst_index:d}'))
+
+        if model.exp.comparison:
+            report = QLabel(model.exp.comparison.report())
+            report.setStyleSheet("font-family : monospace")
+            diag.layout().addWidget(report)
+
         total_time = model.exp_complete_time - model.exp_start_time
-        per_exp_time = total_time / model.boards_n
+        per_exp_time = total_time / results.n
         diag.layout().addWidget(QLabel("Total time = "+f'{total_time:.5f}'))
         diag.layout().addWidget(QLabel("Average time = "+f'{per_exp_time:.5f}'))
 
@@ -186,9 +204,14 @@ class OptsWidget(QFrame):
         ships_colview.setModel(model.ships)
         ships_colview.setEditTriggers(QAbstractItemView.EditTrigger(0))
 
+        no_touch_box = QCheckBox("No touching")
+        no_touch_box.setChecked(model.no_touch)
+        no_touch_box.stateChanged.connect(model.on_no_touch_changed)
+
         ships_layout = QVBoxLayout()
         ships_layout.addWidget(ships_tools)
         ships_layout.addWidget(ships_colview)
+        ships_layout.addWidget(no_touch_box)
         ships.setLayout(ships_layout)
         ships.setMinimumHeight(100)
         ships.setFixedWidth(175)
@@ -198,6 +221,7 @@ class OptsWidget(QFrame):
         model.widgets["ShipsAddButton"] = plus_button
         model.widgets["ShipsRemoveButton"] = minus_button
         model.widgets["ShipsSizeEntry"] = size_entry
+        model.widgets["NoTouchBox"] = no_touch_box
 
         self.constrain_size_entry()
 
@@ -267,6 +291,24 @@ class DynamicProgressLabel(QLabel):
 
 
 
+class DynamicEstimateLabel(QLabel):
+    """
+    Running mean score and confidence interval of a sampled experiment
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setAlignment(Qt.AlignmentFlag.AlignRight)
+        model.experiment_started_signal.connect(self.on_experiment_started)
+        model.experiment_estimate_signal.connect(self.on_estimate_updated)
+
+    def on_experiment_started(self, ignored):
+        self.setText("")
+
+    def on_estimate_updated(self, mean, half_width):
+        self.setText(f'{mean:.2f} +/- {half_width:.2f}')
+
+
 class DynamicScoreLabel(QLabel):
 
     pretext = "Score = "
@@ -319,13 +361,52 @@ class InteractiveTab(BShipTab):
         checkie = QPushButton("Show Heatmap")
         checkie.pressed.connect(self.gamebox.show_heat)
 
-        for w in [score, par, checkie]:
+        visualise = QPushButton("Visualise")
+        visualise.pressed.connect(self.show_candidates)
+
+        for w in [score, par, checkie, visualise]:
             w.setMinimumWidth(80)
             self.game_buttons.layout().addWidget(w)
 
         gl.addWidget(self.game_buttons)
 
 
+    def show_candidates(self):
+        """
+        Show the remaining possible boards: a count, a random preview and a lazily loaded list
+        """
+        browser = model.candidate_browser()
+        if browser is None:
+            return
+
+        diag = QDialog()
+        diag.setWindowTitle("Remaining boards")
+        diag.setLayout(QVBoxLayout())
+        diag.layout().addWidget(QLabel(f"{browser.count} boards remain. A random few:"))
+
+        preview = QWidget()
+        preview.setLayout(QHBoxLayout())
+        for i, board in browser.preview():
+            label = QLabel(f"Board {i}\n" + board_text(board, model.width, model.height))
+            label.setStyleSheet("font-family : monospace")
+            preview.layout().addWidget(label)
+        diag.layout().addWidget(preview)
+
+        diag.layout().addWidget(QLabel("All of them, in order:"))
+        view = QListView()
+        view.setStyleSheet("font-family : monospace")
+        view.setUniformItemSizes(True)
+        # kept referenced until the dialog closes: the view doesn't own its model
+        candidates = CandidateListModel(browser, model.width, model.height)
+        view.setModel(candidates)
+        diag.layout().addWidget(view)
+
+        exit_button = QPushButton("Ok cool")
+        diag.layout().addWidget(exit_button)
+        exit_button.pressed.connect(diag.close)
+        diag.exec()
+
+
 class GameBoxButton(QPushButton):
 
     press_trigger = pyqtSignal(int)
@@ -395,6 +476,8 @@ class GameBox(QWidget):
         self.display_boxes = []
         self.playing = False
         self.tabnum = tabnum
+        self.replay_timer = None
+        self.replay_events = []
         self.setLayout(QGridLayout())
         self.layout().setContentsMargins(0,0,0,0)
         self.layout().setSpacing(0)
@@ -468,12 +551,42 @@ class GameBox(QWidget):
         y,x = coord_to_xy(scalar_coord)
         self.box_at(x, y).set_miss()
 
+    def replay(self, events, interval):
+        """
+        Replay a recorded game's (guess, hit) events, one guess every interval milliseconds
+        The game must have been recorded on the current grid size.
+        """
+        self.stop_replay()
+        self.set_enabled_all(True)
+        self.replay_events = list(reversed(events))
+        self.replay_timer = QTimer(self)
+        self.replay_timer.timeout.connect(self.replay_step)
+        self.replay_timer.start(interval)
+
+    def replay_step(self):
+        if not self.replay_events:
+            self.stop_replay()
+            return
+        g, hit = self.replay_events.pop()
+        y,x = coord_to_xy(g)
+        if hit:
+            self.box_at(x, y).set_hit()
+        else:
+            self.box_at(x, y).set_miss()
+
+    def stop_replay(self):
+        if self.replay_timer:
+            self.replay_timer.stop()
+            self.replay_timer = None
+        self.replay_events = []
+
     def on_gridsize_changed(self):
         self.populate()
 
     def on_game_started(self):
         if not self.isVisible():
             return
+        self.stop_replay()
         self.set_enabled_all(True)
 
     def on_game_terminated(self):
@@ -552,12 +665,31 @@ class ExperimentTab(BShipTab):
         self.show_box.stateChanged.connect(self.on_show_changed)
         self.show_changed.connect(model.on_show_changed)
 
+        self.sample_box = QCheckBox("Sample")
+        self.sample_box.setChecked(False)
+        self.sample_box.setFixedWidth(70)
+        self.sample_box.stateChanged.connect(self.on_sample_changed)
+
+        self.record_box = QCheckBox("Record")
+        self.record_box.setChecked(False)
+        self.record_box.setFixedWidth(70)
+        self.record_box.stateChanged.connect(self.on_record_changed)
+
+        replay_button = QPushButton("Replay")
+        replay_button.setFixedWidth(70)
+        replay_button.pressed.connect(self.on_replay_pressed)
+
+        estimate_label = DynamicEstimateLabel()
+
         strat_selector = self.strategy_selector()
 
-        for w in [strat_selector, progress_label, self.show_box]:
+        for w in [strat_selector, estimate_label, progress_label, self.sample_box, self.record_box, replay_button,
+                  self.show_box]:
             game_buttons_layout.addWidget(w)
 
         model.widgets["ShowExperimentButton"] = self.show_box
+        model.widgets["SampleExperimentButton"] = self.sample_box
+        model.widgets["RecordExperimentButton"] = self.record_box
         model.widgets["StrategySelector"] = strat_selector
 
         progress = ExperimentProgressBar()
@@ -581,6 +713,49 @@ class ExperimentTab(BShipTab):
         self.gamebox.set_enabled_all(False)
         self.show_changed.emit(self.show_box.isChecked())
 
+    def on_sample_changed(self):
+        model.on_sample_changed(self.sample_box.isChecked())
+
+    def on_record_changed(self):
+        model.on_record_changed(self.record_box.isChecked())
+
+    def on_replay_pressed(self):
+        """
+        Choose a board from the last recorded experiment and replay it on the gamebox
+        """
+        path = model.trace_path or TRACE_PATH_DEFAULT
+        if (model.exp and model.exp.is_alive()) or not os.path.exists(path):
+            return
+        reader = TraceReader(path)
+        boards = reader.boards()
+        if not boards:
+            return
+
+        diag = QDialog()
+        diag.setLayout(QVBoxLayout())
+        board_field = QSpinBox()
+        board_field.setRange(boards[0], boards[-1])
+        results = model.exp.results if model.exp else None
+        if results and results.worst_index in reader.index:
+            board_field.setValue(results.worst_index)
+        speed_field = QSpinBox()
+        speed_field.setRange(1, 5000)
+        speed_field.setValue(REPLAY_INTERVAL_DEFAULT)
+        speed_field.setSuffix(" ms")
+        diag.layout().addWidget(QLabel("Board"))
+        diag.layout().addWidget(board_field)
+        diag.layout().addWidget(QLabel("Time per guess"))
+        diag.layout().addWidget(speed_field)
+
+        def play():
+            diag.close()
+            self.gamebox.replay(reader.events(board_field.value()), speed_field.value())
+
+        play_button = QPushButton("Replay")
+        diag.layout().addWidget(play_button)
+        play_button.pressed.connect(play)
+        diag.exec()
+
     def strategy_selector(self):
         selector = QComboBox()
         selector.setModel(model.strategies)
@@ -0,0 +1,110 @@
+from collections import deque
+from random import Random
+from time import perf_counter
+
+from bship_board_factory import BoardFactory
+from bship_game import BShipGame
+
+MOVE_BUDGET_DEFAULT = 0.05
+
+# Surviving boards drawn for the first, rough estimate of each move
+ANYTIME_SAMPLES = 200
+
+
+class AnytimeBShipGame(BShipGame):
+    """
+    A Battleship game which spends at most move_budget seconds updating beliefs after each guess
+    Each update starts from a probability estimate over a random sample of the surviving boards,
+        then replaces it with exact probabilities square by square (most promising squares for the
+        strategy first) until the deadline. refine() finishes the exact computation later, e.g.
+        while the GUI is idle; an exact answer is always computed if it is needed to move at all.
+    """
+
+    def __init__(self, ships: list, bf: BoardFactory, strategy: int = 0,
+                 move_budget: float = MOVE_BUDGET_DEFAULT, seed=None, backend: str = None):
+        self.move_budget = move_budget
+        # kept apart from the game's own generator, so estimates don't change Rand's guesses
+        self.estimate_rng = Random(seed)
+        # squares whose probability is still only an estimate, most promising first
+        self.pending = deque()
+        super().__init__(ships, bf, strategy, seed=seed, backend=backend)
+
+    def update_prob_beliefs(self) -> None:
+        using_prob_beliefs = self.strategy not in [2, 3]
+        misses = frozenset(self.trace)
+        cached = self.bf.get_miss_beliefs(misses) if using_prob_beliefs and self.achieved_hits == 0 else None
+        if cached is not None:
+            self.prob_beliefs = cached
+            self.pending = deque()
+            return
+
+        deadline = perf_counter() + self.move_budget
+        self.prob_beliefs = self.estimate(deadline)
+        self.pending = deque(sorted((g for g in range(self.w * self.h) if g not in self.trace),
+                                    key=lambda g: self.priority(self.prob_beliefs[g])))
+        self.refine_until(deadline)
+
+    def estimate(self, deadline=None) -> dict:
+        """
+        Hit probabilities over a random sample of the surviving boards; exact for guessed squares
+        """
+        sample = self.backend.sample(self.beliefs, ANYTIME_SAMPLES, self.estimate_rng, deadline)
+        counts = [0] * (self.w * self.h)
+        for i in sample:
+            for c in set(self.bf.default_boards[i]):
+                counts[c] += 1
+        estimate = {g: (counts[g] / len(sample)) * 100 for g in range(self.w * self.h)}
+        for g, hit in self.trace.items():
+            estimate[g] = 100 if hit else 0
+        return estimate
+
+    def priority(self, p: float) -> float:
+        """
+        Sort key putting the squares the strategy is most likely to choose first
+        """
+        if self.strategy == 1:
+            return -p if p < 100 else 100
+        if self.strategy == 4:
+            return p if p > 0 else 100
+        return abs(p - 50)
+
+    def refine_until(self, deadline) -> bool:
+        """
+        Compute exact probabilities for pending squares until the deadline (None: until done)
+        Returns True once every probability is exact.
+        """
+        while self.pending:
+            if deadline is not None and perf_counter() > deadline:
+                return False
+            g = self.pending.popleft()
+            self.prob_beliefs[g] = self.guess_chance(g)
+
+        using_prob_beliefs = self.strategy not in [2, 3]
+        if using_prob_beliefs and self.achieved_hits == 0:
+            self.prob_beliefs = self.bf.add_to_miss_cache(self.prob_beliefs, frozenset(self.trace))
+        return True
+
+    def refine(self, budget: float = None) -> bool:
+        """
+        Spend up to budget seconds (None: as long as it takes) making the probabilities exact
+        """
+        return self.refine_until(None if budget is None else perf_counter() + budget)
+
+    def is_exact(self) -> bool:
+        return not self.pending
+
+    def get_best_guess(self) -> int:
+        best_g = super().get_best_guess()
+        if best_g == -1 and self.pending:
+            # the estimate thinks everything is known, but that isn't proven: do it properly
+            self.refine()
+            best_g = super().get_best_guess()
+        return best_g
+
+    def detect_il_win(self) -> bool:
+        """
+        Exact even while probabilities are estimates: won once the survivors all cover the same squares
+        """
+        if not self.pending:
+            return super().detect_il_win()
+        return self.survivors_agree()
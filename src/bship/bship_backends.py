@@ -0,0 +1,347 @@
+import os
+from time import perf_counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# Names accepted by select_backend() and make_backend()
+PYTHON = "python"
+BITSET = "bitset"
+NUMPY = "numpy"
+TORCH = "torch"
+
+# Overrides automatic selection everywhere, e.g. BSHIP_BACKEND=bitset, for benchmarking
+BACKEND_ENV = "BSHIP_BACKEND"
+
+# Bitsets beat sets at every size (popcounts instead of set intersections); dense arrays only
+#     catch up once each vectorised call covers this many boards
+DENSE_MIN_BOARDS = 1_000_000
+
+# Dense backends hold one byte per (board, square): above this they fall back to bitsets
+DENSE_LIMIT = 200_000_000
+
+# Boards converted at a time when iterating over a dense state
+ITER_CHUNK = 65536
+
+# sample() draws boards at random and keeps the ones in the state while at least this fraction of
+#     all boards are; below it, one pass over the state's boards is cheaper
+SAMPLE_REJECTION_MIN_FRACTION = 0.01
+
+
+class BeliefBackend:
+    """
+    Interface of a belief engine over the boards of a BoardFactory
+    A belief state is an immutable value (a frozenset, an int, an array...) opaque to the game:
+        observe() returns a new state rather than changing its argument, so states can be shared
+        through BeliefMemo, and every game starts from the same shared initial state.
+    Every backend counts boards exactly, and the probabilities are computed from those counts by
+        the same expression, so every backend gives identical results.
+    """
+    name = None
+
+    def __init__(self, bf):
+        self.n_boards = len(bf.default_boards)
+        self.n_cells = bf.w * bf.h
+
+    def initialize(self):
+        """
+        State in which every board is possible (shared, not built per game)
+        """
+        return self.all_boards
+
+    def observe(self, state, coord: int, hit: bool):
+        """
+        State after a guess at coord: keeps the boards containing coord if hit, else the others
+        """
+        raise NotImplementedError
+
+    def count(self, state, coord: int) -> int:
+        """
+        Number of boards of state containing coord
+        """
+        raise NotImplementedError
+
+    def counts(self, state) -> list:
+        return [self.count(state, c) for c in range(self.n_cells)]
+
+    def candidate_count(self, state) -> int:
+        raise NotImplementedError
+
+    def indices(self, state) -> list:
+        """
+        Indices (into default_boards) of the boards of state
+        """
+        raise NotImplementedError
+
+    def iter_indices(self, state):
+        """
+        The same indices in increasing order, generated lazily
+        """
+        return iter(sorted(self.indices(state)))
+
+    def contains(self, state, board_index: int) -> bool:
+        raise NotImplementedError
+
+    def sample(self, state, k: int, rng, deadline: float = None) -> list:
+        """
+        Up to k distinct board indices drawn uniformly from the state, never listing it whole
+        Boards are drawn one at a time, so the draw can stop at a deadline (a perf_counter()
+            time) once it has at least one board.
+        """
+        n = self.candidate_count(state)
+        k = min(k, n)
+        if n >= self.n_boards * SAMPLE_REJECTION_MIN_FRACTION:
+            chosen = set()
+            while len(chosen) < k and not (chosen and deadline is not None and perf_counter() > deadline):
+                i = rng.randrange(self.n_boards)
+                if self.contains(state, i):
+                    chosen.add(i)
+            return list(chosen)
+
+        # reservoir sampling: one pass, k boards in memory
+        chosen = []
+        for seen, i in enumerate(self.iter_indices(state)):
+            if chosen and deadline is not None and perf_counter() > deadline:
+                break
+            if seen < k:
+                chosen.append(i)
+            else:
+                j = rng.randrange(seen + 1)
+                if j < k:
+                    chosen[j] = i
+        return chosen
+
+    def is_won(self, state) -> bool:
+        """
+        True if every board of state covers the same squares, i.e. all contents are deduced
+        """
+        raise NotImplementedError
+
+    def probabilities(self, state, counts: list = None) -> dict:
+        """
+        Percentage chance of a hit at each square (as BShipGame.guess_chance()), from the
+            state's counts() if already known
+        """
+        n = self.candidate_count(state)
+        if counts is None:
+            counts = self.counts(state)
+        return {g: (counts[g] / n) * 100 for g in range(self.n_cells)}
+
+
+class PythonSetBackend(BeliefBackend):
+    """
+    States are frozensets of board indices, filtered by BoardFactory.boards_containing
+    """
+    name = PYTHON
+
+    def __init__(self, bf):
+        super().__init__(bf)
+        self.boards = bf.default_boards
+        self.containing = bf.boards_containing
+        self.all_boards = frozenset(range(self.n_boards))
+
+    def observe(self, state, coord: int, hit: bool):
+        if hit:
+            return state & self.containing[coord]
+        return state - self.containing[coord]
+
+    def count(self, state, coord: int) -> int:
+        return len(self.containing[coord] & state)
+
+    def candidate_count(self, state) -> int:
+        return len(state)
+
+    def indices(self, state) -> list:
+        return list(state)
+
+    def iter_indices(self, state):
+        return (i for i in range(self.n_boards) if i in state)
+
+    def contains(self, state, board_index: int) -> bool:
+        return board_index in state
+
+    def is_won(self, state) -> bool:
+        first = None
+        for i in state:
+            squares = frozenset(self.boards[i])
+            if first is None:
+                first = squares
+            elif squares != first:
+                return False
+        return True
+
+
+class BitsetBackend(BeliefBackend):
+    """
+    States are ints with bit i set if board i is possible; each square has the mask of the
+        boards containing it, so filtering is one AND and counting is one popcount
+    """
+    name = BITSET
+
+    def __init__(self, bf):
+        super().__init__(bf)
+        n_bytes = self.n_boards // 8 + 1
+        self.masks = []
+        for c in range(self.n_cells):
+            bits = bytearray(n_bytes)
+            for i in bf.boards_containing[c]:
+                bits[i >> 3] |= 1 << (i & 7)
+            self.masks.append(int.from_bytes(bits, 'little'))
+        self.all_boards = (1 << self.n_boards) - 1
+
+    def observe(self, state, coord: int, hit: bool):
+        if hit:
+            return state & self.masks[coord]
+        return state & ~self.masks[coord]
+
+    def count(self, state, coord: int) -> int:
+        return (state & self.masks[coord]).bit_count()
+
+    def candidate_count(self, state) -> int:
+        return state.bit_count()
+
+    def indices(self, state) -> list:
+        # a byte at a time: peeling bits off the whole state would copy it once per board
+        return list(self.iter_indices(state))
+
+    def iter_indices(self, state):
+        for byte_index, byte in enumerate(state.to_bytes((state.bit_length() + 7) // 8, 'little')):
+            while byte:
+                low = byte & -byte
+                yield byte_index * 8 + low.bit_length() - 1
+                byte ^= low
+
+    def contains(self, state, board_index: int) -> bool:
+        return bool(state >> board_index & 1)
+
+    def is_won(self, state) -> bool:
+        return all((state & m) in (0, state) for m in self.masks)
+
+
+class NumPyBackend(BeliefBackend):
+    """
+    States are boolean vectors over boards; the occupancy matrix is held square-major, so each
+        observation and each square's count reads one contiguous row
+    """
+    name = NUMPY
+
+    def __init__(self, bf):
+        super().__init__(bf)
+        self.cols = np.zeros((self.n_cells, self.n_boards), dtype=bool)
+        for c in range(self.n_cells):
+            self.cols[c, list(bf.boards_containing[c])] = True
+        self.all_boards = np.ones(self.n_boards, dtype=bool)
+        self.all_boards.setflags(write=False)
+
+    def observe(self, state, coord: int, hit: bool):
+        if hit:
+            return state & self.cols[coord]
+        return state & ~self.cols[coord]
+
+    def count(self, state, coord: int) -> int:
+        return int(np.count_nonzero(state & self.cols[coord]))
+
+    def counts(self, state) -> list:
+        return np.count_nonzero(self.cols[:, state], axis=1).tolist()
+
+    def candidate_count(self, state) -> int:
+        return int(np.count_nonzero(state))
+
+    def indices(self, state) -> list:
+        return np.flatnonzero(state).tolist()
+
+    def iter_indices(self, state):
+        for start in range(0, self.n_boards, ITER_CHUNK):
+            yield from (np.flatnonzero(state[start:start + ITER_CHUNK]) + start).tolist()
+
+    def contains(self, state, board_index: int) -> bool:
+        return bool(state[board_index])
+
+    def is_won(self, state) -> bool:
+        alive = self.cols[:, state]
+        return bool((alive == alive[:, :1]).all())
+
+
+class TorchBackend(BeliefBackend):
+    """
+    As NumPyBackend, with CPU tensors
+    """
+    name = TORCH
+
+    def __init__(self, bf):
+        super().__init__(bf)
+        self.cols = torch.zeros((self.n_cells, self.n_boards), dtype=torch.bool)
+        for c in range(self.n_cells):
+            self.cols[c, list(bf.boards_containing[c])] = True
+        # never modified in place: observe() always builds a new tensor
+        self.all_boards = torch.ones(self.n_boards, dtype=torch.bool)
+
+    def observe(self, state, coord: int, hit: bool):
+        if hit:
+            return state & self.cols[coord]
+        return state & ~self.cols[coord]
+
+    def count(self, state, coord: int) -> int:
+        return int(torch.count_nonzero(state & self.cols[coord]))
+
+    def counts(self, state) -> list:
+        return torch.count_nonzero(self.cols[:, state], dim=1).tolist()
+
+    def candidate_count(self, state) -> int:
+        return int(torch.count_nonzero(state))
+
+    def indices(self, state) -> list:
+        return torch.nonzero(state).flatten().tolist()
+
+    def iter_indices(self, state):
+        for start in range(0, self.n_boards, ITER_CHUNK):
+            yield from (torch.nonzero(state[start:start + ITER_CHUNK]).flatten() + start).tolist()
+
+    def contains(self, state, board_index: int) -> bool:
+        return bool(state[board_index])
+
+    def is_won(self, state) -> bool:
+        alive = self.cols[:, state]
+        return bool((alive == alive[:, :1]).all())
+
+
+BACKENDS = {PYTHON: PythonSetBackend, BITSET: BitsetBackend, NUMPY: NumPyBackend, TORCH: TorchBackend}
+
+
+def available_backends() -> list:
+    names = [PYTHON, BITSET]
+    if np is not None:
+        names.append(NUMPY)
+    if torch is not None:
+        names.append(TORCH)
+    return names
+
+
+def select_backend(n_boards: int, n_cells: int, override: str = None) -> str:
+    """
+    Name of the fastest available backend for a problem size, unless overridden (by argument,
+        or else by the BSHIP_BACKEND environment variable)
+    """
+    override = override or os.environ.get(BACKEND_ENV)
+    if override:
+        if override not in available_backends():
+            raise ValueError(f"Belief backend {override!r} is not available")
+        return override
+
+    if DENSE_MIN_BOARDS <= n_boards and n_boards * n_cells <= DENSE_LIMIT:
+        if np is not None:
+            return NUMPY
+        if torch is not None:
+            return TORCH
+    return BITSET
+
+
+def make_backend(name: str, bf) -> BeliefBackend:
+    return BACKENDS[name](bf)
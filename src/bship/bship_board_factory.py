@@ -1,42 +1,55 @@
-
 import math
-from random import randint
+import threading
+from random import randrange
+from types import MappingProxyType
 
+from bship_backends import make_backend, select_backend
+from bship_placements import blocking_masks, cells_to_mask, ship_placements
 
-class BoardFactory:
-    def __init__(self, w: int, h: int, ship_descr: tuple):
+
+class BoardIndex:
+    """
+    Every board of a (w, h, fleet) configuration, and for each square the boards containing it
+    With no_touch, ships may not touch each other, even diagonally (as in many rulesets).
+    Never modified after construction, so one index can be shared freely between threads
+        (and between several BoardFactory objects) with no locking.
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, boards: list = None, no_touch: bool = False):
 
         self.w = w
         self.h = h
         self.shipdescr = ship_descr
-        self.default_boards = self.get_all_boards_from_shipdescr(self.shipdescr)
+        self.no_touch = no_touch
+        # boards may be supplied pre-built (see extend()), otherwise enumerate them all
+        if boards is None:
+            boards = self.get_all_boards_from_shipdescr(self.shipdescr)
+        self.default_boards = boards
         self.boards_containing = {}
-        self.miss_cache = {}
 
         self.populate_boards_containing()
 
-    def add_to_miss_cache(self, beliefs: dict, at_index: int):
-        """
-        When a series of misses is recorded by the game object, we can save and record its beliefs
-        Since a string of misses is very likely (and also very expensive to compute beliefs for)
-            this is a very big performance improvement.
-        """
-        self.miss_cache[at_index] = beliefs.copy()
-
-    def get_random_board(self):
+    def extend(self, ship_descr: tuple):
         """
-        Draws a random board from the generated boards
+        Derive the index for ship_descr, which must start with our fleet, by placing only the
+            extra ships onto our already generated boards.
+        Boards come out in exactly the order of a fresh enumeration of ship_descr.
         """
-        random_index = randint(0, len(self.default_boards))
-        return self.default_boards[random_index]
+        ship_descr = tuple(ship_descr)
+        if ship_descr[:len(self.shipdescr)] != tuple(self.shipdescr):
+            raise ValueError(f"Fleet {ship_descr} doesn't start with {self.shipdescr}")
+        extra = ship_descr[len(self.shipdescr):]
+        boards = self.get_all_boards_from_shipdescr(extra, self.default_boards)
+        return BoardIndex(self.w, self.h, tuple(ship_descr), boards, self.no_touch)
 
     def populate_boards_containing(self):
 
         for i in range(0, self.w*self.h):
-            self.boards_containing[i] = set()
+            containing = set()
             for j in range(0, len(self.default_boards)):
                 if i in self.default_boards[j]:
-                    self.boards_containing[i] |= {j}
+                    containing |= {j}
+            self.boards_containing[i] = frozenset(containing)
 
     def show_board(self, np_board):
         """
@@ -85,73 +98,24 @@ class BoardFactory:
         y = math.floor(coord / self.w)
         return x, y
 
-    def evaluate_placement(self, ship: int, board_list: list, root: int, direction: int) -> bool:
-        """
-        Return true if the placement is valid; in-bounds and not colliding
-        """
-        if root > self.w * self.h - 1:
-            # db("Out of bounds completely")
-            return False
-        if (self.coord_to_xy(root)[1] != self.coord_to_xy(root+ship-1)[1]
-                and direction == 0):
-            # db("Out of x bounds")
-            return False
-        if (self.coord_to_xy(root + (self.w * (ship-1)))[1] > self.h - 1
-                and direction == 1):
-            # db("Out of y bounds")
-            return False
-
-        for i in range(0, ship):
-            if direction == 0:
-                coord = root + i
-            elif direction == 1:
-                coord = root + (i * self.w)
-            else:
-                return False
-
-            # collision check
-            if coord in board_list:
-                return False
-
-        return True
-
-    def find_all_fits(self, ship: int, board_list: list) -> list:
-        """
-        Given a board and a ship, return all positions where it is
-        feasible to add the ship; as a Pylist
-        """
-        fits = []
-        for r in range(0, self.w * self.h):
-            for d in (0, 1):
-                if self.evaluate_placement(ship, board_list, r, d):
-                    fits.append((r, d))
-        return fits
-
-    def board_repr(self, root: int, ship: int, direction: int) -> list:
-        """
-        Given a root, length, dir, return a dense Pylist of coordinate positions
+    def get_all_resulting_boards(self, ship, board: list) -> list:
         """
-        if direction == 0:
-            return [root + i for i in range(0,ship)]
-        if direction == 1:
-            return [root + (i * self.w) for i in range(0, ship)]
-
-    def get_all_resulting_boards(self, ship: int, board: list) -> list:
-        """
-        Accepts a ship and a board
+        Accepts a ship (a length or a shape, see ship_placements()) and a board
         Returns a Pylist of boards which are possible placements for the ship.
         """
-        boards = []
-        for f in self.find_all_fits(ship, board):
-            bship = self.board_repr(f[0], ship, f[1])
-            boards += [board + bship]
-        return boards
+        occupied = cells_to_mask(board)
+        blocking = blocking_masks(self.w, self.h, ship, self.no_touch)
+        return [board + list(cells)
+                for cells, blocked in zip(ship_placements(self.w, self.h, ship), blocking)
+                if not blocked & occupied]
 
-    def get_all_boards_from_shipdescr(self, ship_descr: tuple) -> list:
+    def get_all_boards_from_shipdescr(self, ship_descr: tuple, boards: list = None) -> list:
         """
         Given a tuple of ships, returns a Pylist of all possible boards that fit the ships.
+        If boards is given, the ships are placed onto each of those boards instead of an empty one.
         """
-        boards = [[]]
+        if boards is None:
+            boards = [[]]
         for s in ship_descr:
             boards_new = []
             for b in boards:
@@ -163,3 +127,139 @@ class BoardFactory:
         return boards
 
 
+def read_only(beliefs) -> MappingProxyType:
+    """
+    A read-only view of a beliefs dict, which can then be shared without copying
+    """
+    return beliefs if isinstance(beliefs, MappingProxyType) else MappingProxyType(beliefs)
+
+
+class BeliefCache:
+    """
+    The mutable, lock-protected state shared by every game played on one BoardIndex: cached
+        beliefs after strings of misses, and the belief backends built over the boards
+    Entries are read-only views (MappingProxyType), handed out and taken in by reference: no
+        game can change one, so none needs copying.
+    """
+
+    def __init__(self, index: BoardIndex):
+        self.index = index
+        self.miss_cache = {}
+        self.backends = {}
+        self.lock = threading.Lock()
+        # building a backend can be slow, so it doesn't hold up miss cache lookups
+        self.backend_lock = threading.Lock()
+
+    def get_miss_beliefs(self, misses: frozenset):
+        """
+        The (read-only) beliefs cached for this set of missed squares, or None
+        """
+        with self.lock:
+            return self.miss_cache.get(misses)
+
+    def add_miss_beliefs(self, misses: frozenset, beliefs) -> MappingProxyType:
+        """
+        Cache beliefs, which the caller must not change afterwards; returns the cached entry
+        """
+        beliefs = read_only(beliefs)
+        with self.lock:
+            return self.miss_cache.setdefault(misses, beliefs)
+
+    def merge_miss_cache(self, miss_cache: dict) -> None:
+        """
+        Add entries (e.g. restored from a checkpoint), keeping any we already have
+        """
+        with self.lock:
+            for misses, beliefs in miss_cache.items():
+                self.miss_cache.setdefault(misses, read_only(beliefs))
+
+    def snapshot_miss_cache(self) -> dict:
+        """
+        A consistent copy of the miss cache with plain dict entries, safe to pickle while games
+            keep adding to it (read-only views can't be pickled)
+        """
+        with self.lock:
+            entries = list(self.miss_cache.items())
+        return {misses: dict(beliefs) for misses, beliefs in entries}
+
+    def get_backend(self, name: str = None):
+        name = select_backend(len(self.index.default_boards), self.index.w * self.index.h, name)
+        with self.backend_lock:
+            if name not in self.backends:
+                self.backends[name] = make_backend(name, self.index)
+            return self.backends[name]
+
+
+class BoardFactory:
+    """
+    A BoardIndex together with its BeliefCache: what games, experiments and the GUI share
+    Safe to use from several threads at once (concurrent experiments, an interactive game and
+        its par computation), since the index is immutable and the cache is locked.
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, boards: list = None, index: BoardIndex = None,
+                 no_touch: bool = False):
+        if index is None:
+            index = BoardIndex(w, h, ship_descr, boards, no_touch)
+        self.index = index
+        self.cache = BeliefCache(index)
+
+        self.w = index.w
+        self.h = index.h
+        self.shipdescr = index.shipdescr
+        self.no_touch = index.no_touch
+        self.default_boards = index.default_boards
+        self.boards_containing = index.boards_containing
+        # read-only view for inspection; go through get_miss_beliefs() and add_to_miss_cache()
+        self.miss_cache = MappingProxyType(self.cache.miss_cache)
+
+    def add_to_miss_cache(self, beliefs, misses: frozenset) -> MappingProxyType:
+        """
+        When a series of misses is recorded by the game object, we can save and record its beliefs
+        Since a string of misses is very likely (and also very expensive to compute beliefs for)
+            this is a very big performance improvement.
+        Keyed by the set of missed squares, so the cache is valid whatever order (or strategy)
+            produced the misses.
+        Returns the read-only cached entry, which the caller should use from then on.
+        """
+        return self.cache.add_miss_beliefs(misses, beliefs)
+
+    def get_miss_beliefs(self, misses: frozenset):
+        return self.cache.get_miss_beliefs(misses)
+
+    def extend(self, ship_descr: tuple):
+        """
+        Derive a factory for ship_descr by placing only the extra ships (see BoardIndex.extend())
+        """
+        return BoardFactory(self.w, self.h, tuple(ship_descr), index=self.index.extend(ship_descr))
+
+    def get_backend(self, name: str = None):
+        """
+        The belief backend for our boards: the named one, or the fastest for our size
+        Built once and shared by every game using this factory.
+        """
+        return self.cache.get_backend(name)
+
+    def get_random_board_index(self, rng=None) -> int:
+        """
+        Index of a random board, drawn from rng (a random.Random) if given
+        """
+        return rng.randrange(len(self.default_boards)) if rng else randrange(len(self.default_boards))
+
+    def get_random_board(self, rng=None):
+        """
+        Draws a random board from the generated boards
+        """
+        return self.default_boards[self.get_random_board_index(rng)]
+
+    def get_all_boards_from_shipdescr(self, ship_descr: tuple, boards: list = None) -> list:
+        return self.index.get_all_boards_from_shipdescr(ship_descr, boards)
+
+    def show_board(self, np_board):
+        self.index.show_board(np_board)
+
+    def xy_to_coord(self, t: tuple):
+        return self.index.xy_to_coord(t)
+
+    def coord_to_xy(self, coord: int):
+        return self.index.coord_to_xy(coord)
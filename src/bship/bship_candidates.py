@@ -0,0 +1,56 @@
+from random import Random
+
+from bship_game import BShipGame
+
+CANDIDATE_PAGE_SIZE = 50
+PREVIEW_SIZE = 6
+
+
+class CandidateBrowser:
+    """
+    Pages through the boards still consistent with a game, in board order, without ever
+        materialising them all: survivors are generated lazily from the belief state, and only
+        the pages fetched so far are kept.
+    The browser works on a snapshot of the beliefs, so it stays valid while the game goes on.
+    """
+
+    def __init__(self, bg: BShipGame, page_size: int = CANDIDATE_PAGE_SIZE, seed=None):
+        self.bf = bg.bf
+        self.backend = bg.backend
+        self.state = bg.beliefs
+        self.page_size = page_size
+        self.rng = Random(seed)
+
+        self.count = self.backend.candidate_count(self.state)
+        self.indices = self.backend.iter_indices(self.state)
+        self.fetched = 0
+
+    def can_fetch_more(self) -> bool:
+        return self.fetched < self.count
+
+    def fetch(self, n: int = None) -> list:
+        """
+        The next page of (board index, board) pairs
+        """
+        page = []
+        for i in self.indices:
+            page.append((i, self.bf.default_boards[i]))
+            if len(page) == (n or self.page_size):
+                break
+        self.fetched += len(page)
+        return page
+
+    def preview(self, k: int = PREVIEW_SIZE) -> list:
+        """
+        Up to k (board index, board) pairs drawn uniformly from the survivors
+        """
+        chosen = sorted(self.backend.sample(self.state, k, self.rng))
+        return [(i, self.bf.default_boards[i]) for i in chosen]
+
+
+def board_text(board: list, w: int, h: int) -> str:
+    """
+    A board as rows of text, "o" for ship squares and "~" for water
+    """
+    squares = set(board)
+    return "\n".join("".join("o" if y * w + x in squares else "~" for x in range(w)) for y in range(h))
@@ -0,0 +1,81 @@
+import os
+import pickle
+import zlib
+
+from bship_board_factory import BoardFactory
+from bship_placements import fleet_name
+
+CHECKPOINT_DIR = os.path.join(os.path.expanduser("~"), ".bship", "checkpoints")
+
+# Number of boards between checkpoints
+CHECKPOINT_STAGGER = 500
+
+# Number of boards sampled to fingerprint a factory's board order
+FINGERPRINT_SAMPLES = 64
+
+
+def board_fingerprint(bf: BoardFactory) -> int:
+    """
+    Cheap checksum of a factory's board order; a checkpoint's board cursor is only meaningful
+        against a factory which enumerates the same boards in the same order.
+    """
+    n = len(bf.default_boards)
+    step = max(1, n // FINGERPRINT_SAMPLES)
+    sampled = [bf.default_boards[i] for i in range(0, n, step)]
+    return zlib.crc32(repr((n, sampled)).encode())
+
+
+def experiment_key(bf: BoardFactory, strat: int, seed) -> tuple:
+    """
+    Everything a checkpoint's results depend on: a checkpoint only resumes the same experiment
+    """
+    return bf.w, bf.h, tuple(bf.shipdescr), bf.no_touch, strat, seed, board_fingerprint(bf)
+
+
+def checkpoint_path_for(directory: str, bf: BoardFactory, strat: int) -> str:
+    """
+    File name for an experiment's checkpoint, one per (w, h, fleet, rules, strategy)
+    """
+    fleet = fleet_name(bf.shipdescr) + ("_nt" if bf.no_touch else "")
+    return os.path.join(directory, f'exp_{bf.w}x{bf.h}_{fleet}_s{strat}.ckpt')
+
+
+def save_checkpoint(path: str, key: tuple, cursor: int, results, miss_cache: dict) -> None:
+    """
+    Atomically write the experiment state: the next board to play, partial results and cache state
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    results.flush()
+    state = {"key": key, "cursor": cursor, "results": results, "miss_cache": miss_cache}
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    # a crash mid-write leaves the previous checkpoint intact
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path: str, key: tuple):
+    """
+    Return the saved state dict if there is a checkpoint for this exact experiment, else None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        # anything from a truncated file to one pickled against classes that have since changed
+        print("Ignoring unreadable checkpoint", path, f"({type(e).__name__}: {e})")
+        return None
+    if state.get("key") != key:
+        return None
+    return state
+
+
+def discard_checkpoint(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
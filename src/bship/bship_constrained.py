@@ -0,0 +1,146 @@
+from bship_board_factory import BoardFactory
+from bship_game import BShipGame
+from bship_monte_carlo import MC_SAMPLES_DEFAULT, SampledBShipGame
+from bship_placements import blocking_masks, placement_masks, ship_placements, ship_size, trace_masks
+
+# Switch a LazyBShipGame to exact beliefs once at most this many boards remain
+EXACT_SWITCH_LIMIT = 20000
+
+
+class ConstrainedEnumerator:
+    """
+    Generates only the boards consistent with known hits and misses
+    Placements covering a miss are never tried, and a partial board is abandoned as soon as
+        some known hit can no longer be covered by any remaining ship. Boards come out in the same
+        format and order as BoardFactory.default_boards filtered by the trace.
+    With no_touch, a placement touching an already placed ship is never tried either.
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, no_touch: bool = False):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.no_touch = no_touch
+        self.placements = [list(zip(placement_masks(w, h, s), ship_placements(w, h, s))) for s in ship_descr]
+        self.blocking = [blocking_masks(w, h, s, no_touch) for s in ship_descr]
+
+        # for each square, the placements of each ship covering it
+        self.covering = [[[m for m, _ in self.placements[k] if m >> c & 1] for k in range(len(ship_descr))]
+                         for c in range(w * h)]
+
+    def coverable(self, k: int, occ: int, hit_mask: int, miss_mask: int) -> bool:
+        """
+        True if every hit not yet covered could still be covered by one of ships k onwards
+        """
+        uncovered = hit_mask & ~occ
+        if uncovered.bit_count() > sum(ship_size(s) for s in self.shipdescr[k:]):
+            return False
+        while uncovered:
+            low = uncovered & -uncovered
+            c = low.bit_length() - 1
+            if not any(not (m & occ or m & miss_mask)
+                       for j in range(k, len(self.shipdescr)) for m in self.covering[c][j]):
+                return False
+            uncovered ^= low
+        return True
+
+    def boards(self, trace: dict = None):
+        """
+        Generator over the consistent boards (lists of squares, as in BoardFactory)
+        """
+        hit_mask, miss_mask = trace_masks(trace or {})
+        n = len(self.shipdescr)
+
+        def place(k, occ, board):
+            if k == n:
+                if occ & hit_mask == hit_mask:
+                    yield board
+                return
+            for (mask, cells), blocked in zip(self.placements[k], self.blocking[k]):
+                if blocked & occ or mask & miss_mask:
+                    continue
+                if not self.coverable(k + 1, occ | mask, hit_mask, miss_mask):
+                    continue
+                yield from place(k + 1, occ | mask, board + list(cells))
+
+        if self.coverable(0, 0, hit_mask, miss_mask):
+            yield from place(0, 0, [])
+
+    def boards_up_to(self, trace: dict, limit: int):
+        """
+        All consistent boards, or None if there are more than limit of them
+        """
+        boards = []
+        for b in self.boards(trace):
+            if len(boards) == limit:
+                return None
+            boards.append(b)
+        return boards
+
+    def factory(self, boards: list) -> BoardFactory:
+        """
+        A BoardFactory over just the given boards, to rebuild exact beliefs on demand
+        """
+        return BoardFactory(self.w, self.h, self.shipdescr, boards, no_touch=self.no_touch)
+
+
+class LazyBShipGame(SampledBShipGame):
+    """
+    Plays with sampled beliefs while the board space is large, and switches to exact beliefs
+        over just the consistent boards once there are few enough of them, so large grids
+        never need the global enumeration. The switch is attempted after each hit.
+    """
+
+    def __init__(self, ships: list, w: int, h: int, ship_descr: tuple, strategy: int = 0,
+                 samples: int = MC_SAMPLES_DEFAULT, seed=None, switch_limit: int = EXACT_SWITCH_LIMIT,
+                 no_touch: bool = False):
+        self.enumerator = ConstrainedEnumerator(w, h, ship_descr, no_touch)
+        self.switch_limit = switch_limit
+        self.exact = False
+        self.backend = None
+        self.beliefs = None
+        super().__init__(ships, w, h, ship_descr, strategy, samples, seed, no_touch)
+
+    def num_satisfying_boards(self):
+        if self.exact:
+            return BShipGame.num_satisfying_boards(self)
+        return super().num_satisfying_boards()
+
+    def filter_beliefs_by_guess(self, coord: int, success):
+        if self.exact:
+            BShipGame.filter_beliefs_by_guess(self, coord, success)
+            return
+        if self.strategy == 3:
+            return
+
+        # misses alone rarely shrink a large space enough, so only try to enumerate after hits
+        boards = None
+        if success:
+            boards = self.enumerator.boards_up_to(self.trace, self.switch_limit)
+        if boards is None:
+            super().filter_beliefs_by_guess(coord, success)
+            return
+
+        # every board of the new factory is consistent with the trace so far
+        self.exact = True
+        self.samples = []
+        self.bf = self.enumerator.factory(boards)
+        self.backend = self.bf.get_backend()
+        self.beliefs = self.backend.initialize()
+        self.update_prob_beliefs()
+
+    def update_prob_beliefs(self) -> None:
+        if self.exact:
+            BShipGame.update_prob_beliefs(self)
+        else:
+            super().update_prob_beliefs()
+
+    def guess_data(self, coord: int) -> tuple:
+        if self.exact:
+            return BShipGame.guess_data(self, coord)
+        return super().guess_data(coord)
+
+    def detect_il_win(self) -> bool:
+        if self.exact:
+            return BShipGame.detect_il_win(self)
+        return super().detect_il_win()
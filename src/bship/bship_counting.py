@@ -0,0 +1,253 @@
+import math
+from collections import Counter, OrderedDict
+
+from bship_game import BShipGame
+from bship_placements import blocking_masks, mask_to_cells, placement_masks, ship_size, trace_masks
+
+COUNT_CACHE_SIZE = 64
+
+# Memoised row transitions are dropped beyond this many, to bound memory on large grids
+TRANSITION_CACHE_LIMIT = 200000
+
+
+class PlacementCounter:
+    """
+    Counts boards consistent with a trace, and for each square the number containing it,
+        without enumerating the boards.
+    A profile DP sweeps the grid row by row. The state after a row is the remaining length of any
+        vertical ship hanging down into each column, plus the ships still to place; every way of
+        filling the next row moves to a new state. Forward and backward passes over the states
+        give, for each row filling, the number of complete boards using it.
+    With no_touch, the state also holds the row's occupied columns, so that a ship starting in
+        the next row can keep clear of them; within a row, ships keep a column apart.
+    Counts agree exactly with len(BoardFactory.default_boards) and boards_containing.
+    The row DP only knows straight ships; a fleet with shaped ships is counted ship by ship over
+        placement masks instead (see compute_by_ship()), which is exact but far slower.
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, no_touch: bool = False):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.no_touch = no_touch
+        self.by_ship = any(not isinstance(s, int) for s in ship_descr)
+        if self.by_ship:
+            self.cache = OrderedDict()
+            return
+
+        # ships of equal length are interchangeable: count one arrangement, then multiply by the
+        # number of ways of assigning the fleet's ships to it (as the enumeration does)
+        lengths = Counter(ship_descr)
+        self.lengths = tuple(sorted(lengths))
+        self.fleet = tuple(lengths[l] for l in self.lengths)
+        self.multiplicity = math.prod(math.factorial(m) for m in self.fleet)
+        self.max_length = max(ship_descr) if ship_descr else 0
+
+        self.transitions = {}
+        self.cache = OrderedDict()
+
+    def count(self, trace: dict = None) -> tuple:
+        """
+        Returns (number of consistent boards, per-square list of consistent boards containing it)
+        """
+        trace = trace or {}
+        key = frozenset(trace.items())
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        compute = self.compute_by_ship if self.by_ship else self.compute
+        result = compute(*trace_masks(trace))
+        self.cache[key] = result
+        if len(self.cache) > COUNT_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return result
+
+    def compute(self, hit_mask: int, miss_mask: int) -> tuple:
+        w, h = self.w, self.h
+        row_bits = (1 << w) - 1
+        hit_rows = [(hit_mask >> (r * w)) & row_bits for r in range(h)]
+        miss_rows = [(miss_mask >> (r * w)) & row_bits for r in range(h)]
+
+        start = ((0,) * w, self.fleet, 0)
+        done = ((0,) * w, (0,) * len(self.fleet))
+
+        # forward: number of ways of reaching each state at the top of each row
+        forward = [{start: 1}]
+        for r in range(h):
+            reached = {}
+            for state, ways in forward[r].items():
+                for new_state, _ in self.row_transitions(state, h - r, hit_rows[r], miss_rows[r]):
+                    reached[new_state] = reached.get(new_state, 0) + ways
+            forward.append(reached)
+
+        # backward: number of ways of completing the board from each state, while accumulating
+        # how many complete boards use each filling of each row
+        counts = [0] * (w * h)
+        completions = {state: 1 for state in forward[h] if state[:2] == done}
+        for r in range(h - 1, -1, -1):
+            previous = {}
+            row_weights = {}
+            for state, ways in forward[r].items():
+                total = 0
+                for new_state, occ in self.row_transitions(state, h - r, hit_rows[r], miss_rows[r]):
+                    after = completions.get(new_state, 0)
+                    if after:
+                        total += after
+                        if occ:
+                            row_weights[occ] = row_weights.get(occ, 0) + ways * after
+                if total:
+                    previous[state] = total
+            for occ, weight in row_weights.items():
+                for c in range(w):
+                    if occ >> c & 1:
+                        counts[r * w + c] += weight * self.multiplicity
+            completions = previous
+
+        total = completions.get(start, 0) * self.multiplicity
+        return total, counts
+
+    def compute_by_ship(self, hit_mask: int, miss_mask: int) -> tuple:
+        """
+        As compute(), for any ships: completions[k][occ] is the number of ways of placing ships k
+            onwards around the squares in occ so as to cover every hit. A forward pass over the
+            occupancies reachable after each ship then weighs each placement by the number of
+            boards using it.
+        """
+        n = len(self.shipdescr)
+        placements = [[(m, blocked) for m, blocked in zip(placement_masks(self.w, self.h, s),
+                                                          blocking_masks(self.w, self.h, s, self.no_touch))
+                       if not m & miss_mask] for s in self.shipdescr]
+        remaining = [sum(ship_size(s) for s in self.shipdescr[k:]) for k in range(n + 1)]
+        completions = [{} for _ in range(n + 1)]
+
+        def complete(k, occ):
+            if (hit_mask & ~occ).bit_count() > remaining[k]:
+                return 0
+            if k == n:
+                return 1
+            ways = completions[k].get(occ)
+            if ways is None:
+                ways = sum(complete(k + 1, occ | m) for m, blocked in placements[k] if not blocked & occ)
+                completions[k][occ] = ways
+            return ways
+
+        total = complete(0, 0)
+        counts = [0] * (self.w * self.h)
+        reached = {0: 1} if total else {}
+        for k in range(n):
+            next_reached = {}
+            for occ, ways in reached.items():
+                for m, blocked in placements[k]:
+                    if blocked & occ:
+                        continue
+                    after = complete(k + 1, occ | m)
+                    if after:
+                        for c in mask_to_cells(m):
+                            counts[c] += ways * after
+                        next_reached[occ | m] = next_reached.get(occ | m, 0) + ways
+            reached = next_reached
+        return total, counts
+
+    def row_transitions(self, state: tuple, rows_left: int, hit_row: int, miss_row: int) -> list:
+        """
+        Every way of filling one row from state: a list of (next state, occupied columns bitmask)
+        Memoised, since most rows of most traces look alike.
+        """
+        key = (state, min(rows_left, self.max_length), hit_row, miss_row)
+        cached = self.transitions.get(key)
+        if cached is not None:
+            return cached
+
+        cols, fleet, above = state
+        w = self.w
+        no_touch = self.no_touch
+        row_bits = (1 << w) - 1
+        new_cols = [0] * w
+        remaining = list(fleet)
+        results = []
+
+        def fill(c, occ):
+            if c == w:
+                results.append(((tuple(new_cols), tuple(remaining), occ if no_touch else 0), occ))
+                return
+            bit = 1 << c
+            # with no_touch, a ship here can't follow straight on from another ship in the row
+            apart = not (no_touch and occ & (bit >> 1))
+            if cols[c]:
+                # a vertical ship continues down through this square
+                if miss_row & bit or not apart:
+                    return
+                new_cols[c] = cols[c] - 1
+                fill(c + 1, occ | bit)
+                new_cols[c] = 0
+                return
+
+            if not hit_row & bit:
+                fill(c + 1, occ)
+            if miss_row & bit or not apart:
+                return
+
+            for k, length in enumerate(self.lengths):
+                if not remaining[k]:
+                    continue
+                remaining[k] -= 1
+                # vertical ship starting here
+                if length <= rows_left and not (no_touch and above & halo(bit)):
+                    new_cols[c] = length - 1
+                    fill(c + 1, occ | bit)
+                    new_cols[c] = 0
+                # horizontal ship starting here (a length 1 ship counts both ways, as in the enumeration)
+                span = ((1 << length) - 1) << c
+                if (c + length <= w and not span & miss_row and all(not cols[j] for j in range(c, c + length))
+                        and not (no_touch and above & halo(span))):
+                    fill(c + length, occ | span)
+                remaining[k] += 1
+
+        def halo(span):
+            # the squares of the row above which a ship starting at span would touch
+            return (span | span << 1 | span >> 1) & row_bits
+
+        fill(0, 0)
+        if len(self.transitions) >= TRANSITION_CACHE_LIMIT:
+            self.transitions.clear()
+        self.transitions[key] = results
+        return results
+
+
+class CountingBShipGame(BShipGame):
+    """
+    A Battleship game with exact beliefs computed by PlacementCounter instead of an enumerated
+        BoardFactory, for grids where materialising every board is impossible
+    """
+
+    def __init__(self, ships: list, w: int, h: int, ship_descr: tuple, strategy: int = 0,
+                 counter: PlacementCounter = None, seed=None, no_touch: bool = False):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        # share a counter between games to share its memoised row transitions
+        self.counter = counter or PlacementCounter(w, h, ship_descr, no_touch)
+        super().__init__(ships, None, strategy, seed=seed)
+
+    def init_beliefs(self, backend: str = None) -> None:
+        self.n_boards = 0
+        self.counts = []
+
+    def num_satisfying_boards(self):
+        return self.n_boards
+
+    def filter_beliefs_by_guess(self, coord: int, success):
+        if self.strategy == 3:
+            return
+        self.update_prob_beliefs()
+
+    def guess_data(self, coord: int) -> tuple:
+        n = self.n_boards
+        n_hits = self.counts[coord]
+        return n, n_hits, n - n_hits
+
+    def update_prob_beliefs(self) -> None:
+        self.n_boards, self.counts = self.counter.count(self.trace)
+        self.prob_beliefs = {g: self.guess_chance(g) for g in range(self.w * self.h)}
+        self.rank_guesses(self.counts)
@@ -0,0 +1,257 @@
+"""
+Coordinator/worker distribution of an experiment over several processes or machines
+
+The coordinator splits the boards of one (w, h, fleet, strategy) job into index ranges and hands
+them out over TCP; workers build (or reuse) the factory locally, play their range and stream the
+results back. Messages are newline-delimited JSON:
+
+    worker -> coordinator   {"type": "hello", "worker": name}
+    coordinator -> worker   {"type": "range", "job": {...}, "start": a, "stop": b}  or  {"type": "done"}
+    worker -> coordinator   {"type": "results", "records": [[board_index, score, hits], ...]}  (any number)
+    worker -> coordinator   {"type": "range_done"}
+
+Results of a range are only merged once it is complete, so the range of a worker which dies or
+goes silent is simply handed to the next idle worker.
+
+    python bship_distributed.py coordinator --width 5 --height 5 --fleet 2 3 4 --strategy 0 --local-workers 4
+    python bship_distributed.py worker --host coordinator.example --port 5555
+"""
+import argparse
+import json
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+from bship_counting import PlacementCounter
+from bship_experiment import EXPERIMENT_SEED, play_board
+from bship_factory_cache import FactoryCache
+from bship_game import board_seed
+from bship_placements import normalise_fleet
+from bship_results import ResultsCollector
+
+DEFAULT_PORT = 5555
+RANGE_SIZE = 200
+
+# Workers send results at least this often, which doubles as a heartbeat
+RESULT_BATCH = 50
+HEARTBEAT_INTERVAL = 5.0
+
+# A worker silent for this long is presumed dead and its range is reassigned
+WORKER_TIMEOUT = 600.0
+IDLE_POLL_INTERVAL = 0.5
+
+
+def send_msg(f, msg: dict) -> None:
+    f.write(json.dumps(msg).encode() + b"\n")
+    f.flush()
+
+
+def recv_msg(f):
+    """
+    Read one message; None if the peer has gone away
+    """
+    line = f.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+class Coordinator:
+    """
+    Hands out board index ranges of one experiment to workers and merges their results
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, strat: int,
+                 host: str = "127.0.0.1", port: int = DEFAULT_PORT, range_size: int = RANGE_SIZE,
+                 n_boards: int = None, results_path: str = None, seed=EXPERIMENT_SEED, no_touch: bool = False):
+        self.job = {"w": w, "h": h, "fleet": list(ship_descr), "strategy": strat, "seed": seed,
+                    "no_touch": no_touch}
+        if n_boards is None:
+            # counted, not enumerated: workers build the factories
+            n_boards = PlacementCounter(w, h, tuple(ship_descr), no_touch).count()[0]
+        self.n_boards = n_boards
+
+        self.pending = deque((a, min(a + range_size, n_boards)) for a in range(0, n_boards, range_size))
+        self.total_ranges = len(self.pending)
+        self.assigned = {}
+        self.completed = 0
+        self.results = ResultsCollector(results_path)
+
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        if self.total_ranges == 0:
+            self.finished.set()
+
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                coordinator.serve_worker(self.request, self.rfile, self.wfile)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def address(self) -> tuple:
+        return self.server.server_address
+
+    def next_range(self, worker: str):
+        with self.lock:
+            if not self.pending:
+                return None
+            rng = self.pending.popleft()
+            self.assigned[rng] = worker
+            return rng
+
+    def complete_range(self, rng: tuple, records: list) -> None:
+        with self.lock:
+            if rng not in self.assigned:
+                return
+            del self.assigned[rng]
+            for record in records:
+                self.results.add(*record)
+            self.completed += 1
+            if self.completed == self.total_ranges:
+                self.finished.set()
+
+    def release_range(self, rng: tuple) -> None:
+        """
+        Put the range of a lost worker back at the front of the queue
+        """
+        with self.lock:
+            if rng in self.assigned:
+                print(f"Worker {self.assigned[rng]} lost; reassigning boards {rng[0]}-{rng[1]}")
+                del self.assigned[rng]
+                self.pending.appendleft(rng)
+
+    def serve_worker(self, sock, rfile, wfile) -> None:
+        sock.settimeout(WORKER_TIMEOUT)
+        rng = None
+        try:
+            hello = recv_msg(rfile)
+            if not hello or hello.get("type") != "hello":
+                return
+            worker = hello.get("worker", str(sock.getpeername()))
+
+            while not self.finished.is_set():
+                rng = self.next_range(worker)
+                if rng is None:
+                    # nothing to hand out, but a busy worker may yet die and release its range
+                    time.sleep(IDLE_POLL_INTERVAL)
+                    continue
+
+                send_msg(wfile, {"type": "range", "job": self.job, "start": rng[0], "stop": rng[1]})
+                records = []
+                while True:
+                    msg = recv_msg(rfile)
+                    if msg is None:
+                        raise ConnectionError("worker disconnected")
+                    if msg["type"] == "results":
+                        records += msg["records"]
+                    elif msg["type"] == "range_done":
+                        break
+                self.complete_range(rng, records)
+                rng = None
+
+            send_msg(wfile, {"type": "done"})
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            if rng is not None:
+                self.release_range(rng)
+
+    def run(self) -> ResultsCollector:
+        """
+        Serve workers until every range is complete; returns the merged results
+        """
+        server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        server_thread.start()
+        self.finished.wait()
+        # let connected workers receive their "done" before closing
+        time.sleep(IDLE_POLL_INTERVAL * 2)
+        self.server.shutdown()
+        self.server.server_close()
+        self.results.close()
+        return self.results
+
+
+def run_worker(host: str, port: int = DEFAULT_PORT, name: str = None) -> int:
+    """
+    Play ranges for the coordinator until it says we are done; returns the number of boards played
+    """
+    factories = FactoryCache()
+    played = 0
+    with socket.create_connection((host, port)) as sock:
+        f = sock.makefile('rwb')
+        send_msg(f, {"type": "hello", "worker": name or f"{socket.gethostname()}:{threading.get_native_id()}"})
+        while True:
+            msg = recv_msg(f)
+            if msg is None or msg["type"] == "done":
+                return played
+
+            job = msg["job"]
+            bf = factories.get(job["w"], job["h"], normalise_fleet(job["fleet"]), job.get("no_touch", False))
+            records = []
+            last_sent = time.monotonic()
+            for i in range(msg["start"], msg["stop"]):
+                bg = play_board(bf, bf.default_boards[i], job["strategy"], seed=board_seed(job.get("seed"), i))
+                records.append([i, bg.guesses, bg.achieved_hits])
+                played += 1
+                if len(records) >= RESULT_BATCH or time.monotonic() - last_sent > HEARTBEAT_INTERVAL:
+                    send_msg(f, {"type": "results", "records": records})
+                    records = []
+                    last_sent = time.monotonic()
+            send_msg(f, {"type": "results", "records": records})
+            send_msg(f, {"type": "range_done"})
+
+
+def spawn_local_workers(n: int, host: str, port: int) -> list:
+    return [subprocess.Popen([sys.executable, __file__, "worker", "--host", host, "--port", str(port)])
+            for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed battleship experiments")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    coord = sub.add_parser("coordinator")
+    coord.add_argument("--width", type=int, required=True)
+    coord.add_argument("--height", type=int, required=True)
+    coord.add_argument("--fleet", type=int, nargs="+", required=True)
+    coord.add_argument("--strategy", type=int, default=0)
+    coord.add_argument("--no-touch", action="store_true", help="ships may not touch, even diagonally")
+    coord.add_argument("--host", default="127.0.0.1")
+    coord.add_argument("--port", type=int, default=DEFAULT_PORT)
+    coord.add_argument("--range-size", type=int, default=RANGE_SIZE)
+    coord.add_argument("--results", default=None, help="write per-board records to this file")
+    coord.add_argument("--local-workers", type=int, default=0, help="spawn this many workers on this machine")
+
+    work = sub.add_parser("worker")
+    work.add_argument("--host", default="127.0.0.1")
+    work.add_argument("--port", type=int, default=DEFAULT_PORT)
+
+    args = parser.parse_args()
+
+    if args.mode == "worker":
+        played = run_worker(args.host, args.port)
+        print(f"Worker finished after {played} boards.")
+        return
+
+    coordinator = Coordinator(args.width, args.height, tuple(args.fleet), args.strategy, args.host, args.port,
+                              args.range_size, results_path=args.results, no_touch=args.no_touch)
+    host, port = coordinator.address
+    print(f"Coordinating {coordinator.n_boards} boards in {coordinator.total_ranges} ranges on {host}:{port}")
+    workers = spawn_local_workers(args.local_workers, host, port)
+    results = coordinator.run()
+    for p in workers:
+        p.wait()
+    print(json.dumps(results.summary()))
+
+
+if __name__ == "__main__":
+    main()
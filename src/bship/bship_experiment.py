@@ -0,0 +1,134 @@
+from collections import OrderedDict
+
+from bship_board_factory import BoardFactory
+from bship_game import BShipGame, board_seed
+from bship_hunt_target import HUNT_TARGET, HuntTargetGame
+from bship_results import ResultsCollector
+
+BELIEF_MEMO_SIZE = 20000
+
+# Experiments are seeded by default, so random strategies give the same results however they are split up
+EXPERIMENT_SEED = 0
+
+STRATEGY_NAMES = {0: "PMed", 1: "PMax", 2: "Rand", 3: "RandFast", 4: "PMin", HUNT_TARGET: "HuntTarget"}
+
+
+def strategy_won(bg: BShipGame, strat: int) -> bool:
+    """
+    Win condition for a strategy: RandFast and HuntTarget have no beliefs, so they must sink
+        every ship; belief-based strategies win once every square is deducible.
+    """
+    if strat in (3, HUNT_TARGET):
+        return bg.detect_hit_win()
+    return bg.detect_il_win()
+
+
+def play_board(bf: BoardFactory, board: list, strat: int, on_guess=None, belief_memo=None, seed=None):
+    """
+    Play one board to the strategy's win condition and return the finished game
+    on_guess(coord, hit) is called after each guess, e.g. to display it.
+    seed seeds the game's random choices (see board_seed()).
+    """
+    if strat == HUNT_TARGET:
+        bg = HuntTargetGame(board, bf.w, bf.h, bf.shipdescr, seed)
+    else:
+        # Note we use the same BoardFactory for every game because caching boost
+        bg = BShipGame(board, bf, strat, belief_memo, seed)
+    while not strategy_won(bg, strat):
+        g = bg.get_best_guess()
+        hit = bg.real_hit(g)
+        if on_guess:
+            on_guess(g, hit)
+    return bg
+
+
+class BeliefMemo:
+    """
+    Bounded LRU memo of belief states (beliefs, prob_beliefs) keyed by the trace that produced them
+    Beliefs depend only on the trace, never on the board being played or on the strategy,
+        so games sharing a memo skip recomputing any state another game has already reached.
+    """
+
+    def __init__(self, maxsize: int = BELIEF_MEMO_SIZE):
+        self.maxsize = maxsize
+        self.states = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: frozenset):
+        state = self.states.get(key)
+        if state is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.states.move_to_end(key)
+        return state
+
+    def put(self, key: frozenset, state: tuple) -> None:
+        self.states[key] = state
+        self.states.move_to_end(key)
+        if len(self.states) > self.maxsize:
+            self.states.popitem(last=False)
+
+
+class ComparativeExperiment:
+    """
+    Plays several strategies against each board in a single pass
+    All strategies share the factory (and its caches) and a BeliefMemo, so a belief state
+        reached by more than one strategy is only computed once.
+    """
+
+    def __init__(self, bf: BoardFactory, strats: tuple, memo_size: int = BELIEF_MEMO_SIZE,
+                 seed=EXPERIMENT_SEED):
+        self.bf = bf
+        self.strats = tuple(strats)
+        self.seed = seed
+        self.memo = BeliefMemo(memo_size)
+        self.results = {s: ResultsCollector() for s in self.strats}
+        # number of boards on which each strategy scored best (ties count for everyone tied)
+        self.best_on = {s: 0 for s in self.strats}
+
+    def play(self, i: int, on_guess=None) -> dict:
+        """
+        Play every strategy on board i; returns the score of each
+        """
+        board = self.bf.default_boards[i]
+        scores = {}
+        for s in self.strats:
+            bg = play_board(self.bf, board, s, on_guess, self.memo, board_seed(self.seed, i))
+            self.results[s].add(i, bg.guesses, bg.achieved_hits)
+            scores[s] = bg.guesses
+
+        best = min(scores.values())
+        for s, score in scores.items():
+            if score == best:
+                self.best_on[s] += 1
+        return scores
+
+    def run(self, start: int = 0, stop: int = None) -> dict:
+        if stop is None:
+            stop = len(self.bf.default_boards)
+        for i in range(start, stop):
+            self.play(i)
+        return self.results
+
+    def report(self) -> str:
+        """
+        Side-by-side table of the strategies' statistics
+        """
+        rows = [("", [STRATEGY_NAMES.get(s, str(s)) for s in self.strats])]
+        summaries = [self.results[s].summary() for s in self.strats]
+        rows.append(("boards", [f'{r["n"]:d}' for r in summaries]))
+        rows.append(("mean", [f'{r["mean"]:.3f}' for r in summaries]))
+        rows.append(("std", [f'{r["std"]:.3f}' for r in summaries]))
+        rows.append(("median", [str(r["median"]) for r in summaries]))
+        rows.append(("p90", [str(r["p90"]) for r in summaries]))
+        rows.append(("max", [str(r["max"]) for r in summaries]))
+        rows.append(("worst board", [str(r["worst_index"]) for r in summaries]))
+        rows.append(("best on", [str(self.best_on[s]) for s in self.strats]))
+
+        label_width = max(len(label) for label, _ in rows)
+        col_width = max(len(cell) for _, cells in rows for cell in cells) + 2
+        lines = [label.ljust(label_width) + "".join(cell.rjust(col_width) for cell in cells)
+                 for label, cells in rows]
+        return "\n".join(lines)
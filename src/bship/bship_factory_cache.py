@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+
+from bship_board_factory import BoardFactory
+
+FACTORY_CACHE_SIZE = 8
+
+
+class FactoryCache:
+    """
+    In-process LRU cache of built BoardFactory objects, keyed by (w, h, fleet, no_touch)
+    Going back to a previous configuration is a lookup, and adding ships to the end of a cached
+        configuration's fleet only places the extra ships instead of re-enumerating everything.
+    Thread-safe: concurrent requests for one configuration share a single build, while requests
+        for other configurations go ahead.
+    """
+
+    def __init__(self, maxsize: int = FACTORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.factories = OrderedDict()
+        self.lock = threading.RLock()
+        # key -> lock held while that configuration is being built
+        self.building = {}
+
+        # statistics, for the curious
+        self.hits = 0
+        self.extensions = 0
+        self.misses = 0
+
+    def get(self, w: int, h: int, ship_descr: tuple, no_touch: bool = False) -> BoardFactory:
+        """
+        Return a factory for the configuration, building or deriving it if necessary
+        """
+        key = (w, h, tuple(ship_descr), no_touch)
+        with self.lock:
+            bf = self.lookup(key)
+            if bf is not None:
+                return bf
+            build_lock = self.building.setdefault(key, threading.Lock())
+
+        # only requests for this configuration wait on its build; the cache stays free for others
+        with build_lock:
+            try:
+                with self.lock:
+                    bf = self.lookup(key)
+                    if bf is not None:
+                        return bf
+                    base = self.find_base(*key)
+                    if base is not None:
+                        self.extensions += 1
+                    else:
+                        self.misses += 1
+
+                if base is not None:
+                    bf = base.extend(key[2])
+                else:
+                    bf = BoardFactory(w, h, key[2], no_touch=no_touch)
+                self.put(bf)
+                return bf
+            finally:
+                with self.lock:
+                    if self.building.get(key) is build_lock:
+                        del self.building[key]
+
+    def lookup(self, key: tuple):
+        """
+        The cached factory for key, counted as a hit, or None; call with the lock held
+        """
+        bf = self.factories.get(key)
+        if bf is not None:
+            self.hits += 1
+            self.factories.move_to_end(key)
+        return bf
+
+    def put(self, bf: BoardFactory) -> None:
+        """
+        Insert a built factory, evicting the least recently used one if full
+        """
+        key = (bf.w, bf.h, tuple(bf.shipdescr), bf.no_touch)
+        with self.lock:
+            self.factories[key] = bf
+            self.factories.move_to_end(key)
+            while len(self.factories) > self.maxsize:
+                self.factories.popitem(last=False)
+
+    def find_base(self, w: int, h: int, ship_descr: tuple, no_touch: bool = False):
+        """
+        Find the cached factory on the same grid and rules whose fleet is the longest proper prefix
+            of ship_descr, or None
+        Only a prefix will do: extending it gives the boards in the order of a fresh enumeration,
+            so board indices (and the seeds derived from them) never depend on what was cached.
+        """
+        best = None
+        with self.lock:
+            factories = list(self.factories.items())
+        for (bw, bh, fleet, b_no_touch), bf in factories:
+            if (bw, bh, b_no_touch) != (w, h, no_touch) or not is_fleet_prefix(fleet, ship_descr):
+                continue
+            if best is None or len(fleet) > len(best.shipdescr):
+                best = bf
+        return best
+
+    def clear(self) -> None:
+        with self.lock:
+            self.factories.clear()
+
+
+def is_fleet_prefix(fleet: tuple, ship_descr: tuple) -> bool:
+    """
+    True if ship_descr starts with all of fleet (at least one ship) and has at least one more ship
+    """
+    return 0 < len(fleet) < len(ship_descr) and tuple(ship_descr[:len(fleet)]) == tuple(fleet)
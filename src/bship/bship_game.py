@@ -1,6 +1,19 @@
-from random import randint
+from random import Random
 
-from bship_board_factory import BoardFactory
+from bship_board_factory import BoardFactory, read_only
+from bship_guess_queue import RANKED_STRATEGIES, GuessQueue
+from bship_placements import fleet_cells
+
+
+def board_seed(seed, board_index: int):
+    """
+    Seed of the game played on one board of a seeded experiment (None if unseeded)
+    It depends on the board alone, so a board's game is the same whichever worker plays it, and
+        in whatever order. String seeds hash identically in every process.
+    """
+    if seed is None:
+        return None
+    return f"{seed}:{board_index}"
 
 
 class BShipGame:
@@ -8,11 +21,13 @@ class BShipGame:
     One instance of a Battleship game
     """
 
-    def __init__(self, ships: list, bf: BoardFactory, strategy: int = 0):
-        # dimensions and ships
-        self.w = bf.w
-        self.h = bf.h
-        self.shipdescr = bf.shipdescr
+    def __init__(self, ships: list, bf: BoardFactory, strategy: int = 0, belief_memo=None, seed=None,
+                 backend: str = None):
+        # dimensions and ships (games without a factory set their own before calling this)
+        if bf is not None:
+            self.w = bf.w
+            self.h = bf.h
+            self.shipdescr = bf.shipdescr
 
         # "actual" board being guessed: a list of ints
         self.ships = ships
@@ -24,9 +39,6 @@ class BShipGame:
         # board factory object
         self.bf = bf
 
-        # set of candidate board indices
-        self.beliefs = set(range(0, len(bf.default_boards)))
-
         # strategy (see get_best_guess())
         self.strategy = strategy
 
@@ -34,8 +46,44 @@ class BShipGame:
         self.achieved_hits = 0
         self.guesses = 0
 
+        # optional memo of belief states keyed by trace, shared between games (see BeliefMemo)
+        self.belief_memo = belief_memo
+
+        # random strategies draw from this generator only, so a seeded game is reproducible
+        self.rng = Random(seed)
+        self.reset_unguessed()
+
+        # ranked strategies pick their guess from this (see rank_guesses())
+        self.guess_queue = None
+        self.ranked = None
+
+        self.init_beliefs(backend)
         self.update_prob_beliefs()
 
+    def init_beliefs(self, backend: str = None) -> None:
+        """
+        Start from every board: a state of the belief backend (by default the fastest for the size)
+        """
+        self.backend = self.bf.get_backend(backend)
+        self.beliefs = self.backend.initialize()
+
+    def reset_unguessed(self) -> None:
+        """
+        Pool of squares not yet guessed, with each square's position in it for O(1) removal
+        """
+        self.unguessed = list(range(self.w * self.h))
+        self.unguessed_at = list(range(self.w * self.h))
+
+    def take_unguessed(self, coord: int) -> None:
+        """
+        Remove a square from the pool by swapping the last square into its place
+        """
+        i = self.unguessed_at[coord]
+        last = self.unguessed.pop()
+        if last != coord:
+            self.unguessed[i] = last
+            self.unguessed_at[last] = i
+
 
     def test_hit(self, coord: int):
         """
@@ -48,6 +96,16 @@ class BShipGame:
         Make a guess; update trace; filter candidates by new information
         """
         success = self.test_hit(coord)
+        self.observe(coord, success)
+        return success
+
+    def observe(self, coord: int, success: bool) -> None:
+        """
+        Record a guess whose outcome is known from elsewhere (e.g. a real opponent's board)
+        """
+        # RandFast may guess a square twice
+        if coord not in self.trace:
+            self.take_unguessed(coord)
         self.trace[coord] = success
 
         # Record hits for caching purposes etc.
@@ -55,10 +113,9 @@ class BShipGame:
             self.achieved_hits += 1
         self.guesses += 1
         self.filter_beliefs_by_guess(coord, success)
-        return success
 
     def num_satisfying_boards(self):
-        return len(self.beliefs)
+        return self.backend.candidate_count(self.beliefs)
 
     def filter_beliefs_by_guess(self, coord: int, success):
 
@@ -66,14 +123,25 @@ class BShipGame:
         if self.strategy == 3:
             return
 
+        # Beliefs depend only on the trace, so another game may already have computed them
+        # (not Rand's: it computes no probabilities, which the other strategies need)
+        use_memo = self.belief_memo is not None and self.strategy != 2
+        if use_memo:
+            key = frozenset(self.trace.items())
+            memoised = self.belief_memo.get(key)
+            if memoised is not None:
+                self.beliefs, self.prob_beliefs = memoised
+                self.rank_guesses()
+                return
+
         # Compute superposition of believed states and new observations
-        if success:
-            self.beliefs = self.beliefs & self.bf.boards_containing[coord]
-        else:
-            self.beliefs = self.beliefs - self.bf.boards_containing[coord]
+        self.beliefs = self.backend.observe(self.beliefs, coord, success)
 
         self.update_prob_beliefs()
 
+        if use_memo:
+            self.belief_memo.put(key, (self.beliefs, self.prob_beliefs))
+
     def guess_data(self, coord: int) -> tuple:
         """
         calculate expected proportions of hits and misses
@@ -85,7 +153,7 @@ class BShipGame:
             # This line of code consumes about 95% of the operational
             # complexity of the program in experiments mode, without caching.
             # Luckily, there is a cache.
-            n_hits = len(self.bf.boards_containing[coord] & self.beliefs)
+            n_hits = self.backend.count(self.beliefs, coord)
         n_misses = n - n_hits
         return n, n_hits, n_misses
 
@@ -103,19 +171,50 @@ class BShipGame:
         """
         using_prob_beliefs = self.strategy not in [2, 3]
 
+        # Rand only needs the surviving boards, to detect a win (see survivors_agree())
+        if self.strategy == 2:
+            self.prob_beliefs = {}
+            return
+
         # Check cached beliefs if we are using a belief-based strategy
         # Cache doesn't make sense for randomised strategies
-        if using_prob_beliefs and self.achieved_hits == 0 and self.guesses in self.bf.miss_cache.keys():
-            self.prob_beliefs = self.bf.miss_cache[self.guesses].copy()
+        # With no hits yet, every square in the trace is a miss
+        misses = frozenset(self.trace)
+        cached = self.bf.get_miss_beliefs(misses) if using_prob_beliefs and self.achieved_hits == 0 else None
+        if cached is not None:
+            self.prob_beliefs = cached
+            self.rank_guesses()
             return
 
-        # Do the very expensive computation otherwise
-        for g in [c for c in range(self.w * self.h)]:
-            self.prob_beliefs[g] = self.guess_chance(g)
+        # Do the very expensive computation otherwise, into a fresh read-only dict: it may be
+        # shared through the miss cache or a BeliefMemo
+        counts = None
+        if self.strategy == 3:
+            probabilities = {g: self.guess_chance(g) for g in range(self.w * self.h)}
+        else:
+            counts = self.backend.counts(self.beliefs)
+            probabilities = self.backend.probabilities(self.beliefs, counts)
+        self.prob_beliefs = read_only(probabilities)
 
         # Cache belief if applicable
-        if using_prob_beliefs and self.achieved_hits == 0 and self.guesses not in self.bf.miss_cache.keys():
-            self.bf.add_to_miss_cache(self.prob_beliefs, self.guesses)
+        if using_prob_beliefs and self.achieved_hits == 0:
+            self.prob_beliefs = self.bf.add_to_miss_cache(self.prob_beliefs, misses)
+        self.rank_guesses(counts)
+
+    def rank_guesses(self, counts: list = None) -> None:
+        """
+        Bring the guess queue up to date with prob_beliefs, given the counts behind them if known
+        """
+        if self.strategy not in RANKED_STRATEGIES:
+            return
+        n = self.num_satisfying_boards()
+        if counts is None:
+            # cached probabilities are exact fractions of n, so the counts come back exactly
+            counts = [round(self.prob_beliefs[g] * n / 100) for g in range(self.w * self.h)]
+        if self.guess_queue is None:
+            self.guess_queue = GuessQueue(self.w * self.h)
+        self.guess_queue.update(counts, n)
+        self.ranked = self.prob_beliefs
 
     def get_best_guess(self) -> int:
         """
@@ -123,6 +222,11 @@ class BShipGame:
         By default (via constructor) returns coord with closest hit% to 50
         """
 
+        # Ranked strategies look their guess up, unless the probabilities came from elsewhere
+        # (e.g. estimates) and were never ranked: then they scan them below
+        if self.guess_queue is not None and self.ranked is self.prob_beliefs:
+            return self.guess_queue.best(self.strategy, self.prob_beliefs)
+
         best_g = -1
 
         if self.strategy == 0:
@@ -154,16 +258,14 @@ class BShipGame:
 
         elif self.strategy == 2:
             # Guess a random square not yet guessed "Rand"
-            # We still need to track probabilistic beliefs to detect a win
-            squares = [g for g in self.prob_beliefs.keys()
-                       if g not in self.trace.keys()]
-            return squares[randint(0, len(squares) - 1)]
+            # We still need to track the surviving boards to detect a win
+            return self.unguessed[self.rng.randrange(len(self.unguessed))]
 
         elif self.strategy == 3:
             # Guess a totally random square regardless of history "RandFast"
             # this strategy never modifies prob_beliefs hence "Fast"
             # it therefore requires fully sinking all ships
-            return randint(0, (self.w * self.h)-1)
+            return self.rng.randrange(self.w * self.h)
 
         return best_g
 
@@ -171,16 +273,26 @@ class BShipGame:
         """
         True if all squares have known (deduced) contents
         """
+        if not self.prob_beliefs:
+            # no probabilities were computed (Rand)
+            return self.survivors_agree()
         for g, p in self.prob_beliefs.items():
             if 0 < p < 100:
                 return False
         return True
 
+    def survivors_agree(self) -> bool:
+        """
+        True if every surviving board covers the same squares, i.e. all contents are deduced
+        This is far cheaper than the probabilities.
+        """
+        return self.backend.is_won(self.beliefs)
+
     def detect_hit_win(self) -> bool:
         """
         True if all ships have been destroyed
         """
-        w = (sum(self.shipdescr)
+        w = (fleet_cells(self.shipdescr)
              == len([i for i in self.trace.items() if i[1]]))
         return w
 
@@ -0,0 +1,102 @@
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappop, heappush
+from itertools import compress
+from operator import ne
+
+# Strategies choosing their guess by ranking the squares' probabilities: PMed, PMax, PMin
+RANKED_STRATEGIES = (0, 1, 4)
+
+
+class GuessQueue:
+    """
+    The squares of a game bucketed by count (the number of candidate boards containing them), so
+        PMed, PMax and PMin find their guess in O(log squares) rather than scanning every square
+    Probabilities are counts over the number of candidates n, so ordering squares by count orders
+        them by probability whatever n is, and only squares whose count changed are moved. Each
+        bucket is a heap of squares with stale entries dropped when met, and the distinct counts
+        are kept sorted. A square with count 0 or n is decided for the rest of the game.
+    Picks exactly the square BShipGame's scan over prob_beliefs would, ties going to the lowest.
+    """
+
+    def __init__(self, n_cells: int):
+        self.counts = [None] * n_cells
+        self.n = 0
+        # count -> heap of squares (some stale: moved to another count since)
+        self.buckets = {}
+        # sorted counts having a bucket
+        self.levels = []
+
+    def update(self, counts: list, n: int) -> None:
+        """
+        Take in the counts after an observation, over n candidate boards
+        """
+        self.n = n
+        for g in list(compress(range(len(counts)), map(ne, self.counts, counts))):
+            c = counts[g]
+            self.counts[g] = c
+            bucket = self.buckets.get(c)
+            if bucket is None:
+                bucket = self.buckets[c] = []
+                insort(self.levels, c)
+            heappush(bucket, g)
+
+    def first_at(self, i: int):
+        """
+        Lowest square whose count is levels[i], or None (the level is then dropped)
+        """
+        c = self.levels[i]
+        bucket = self.buckets[c]
+        while bucket and self.counts[bucket[0]] != c:
+            heappop(bucket)
+        if bucket:
+            return bucket[0]
+        del self.buckets[c]
+        del self.levels[i]
+        return None
+
+    def highest_below(self, limit: int):
+        """
+        (count, square) with the highest count below limit, lowest square first; (None, -1) if none
+        """
+        i = bisect_left(self.levels, limit) - 1
+        while i >= 0:
+            g = self.first_at(i)
+            if g is not None:
+                return self.levels[i], g
+            i -= 1
+        return None, -1
+
+    def lowest_above(self, limit: int, stop: int):
+        """
+        (count, square) with the lowest count above limit and below stop; (None, -1) if none
+        """
+        i = bisect_right(self.levels, limit)
+        while i < len(self.levels) and self.levels[i] < stop:
+            g = self.first_at(i)
+            if g is not None:
+                return self.levels[i], g
+        return None, -1
+
+    def best(self, strategy: int, prob_beliefs: dict) -> int:
+        """
+        The guess of a ranked strategy, or -1 if every square is decided
+        """
+        n = self.n
+        if strategy == 1:
+            # PMax: highest probability under 100
+            return self.highest_below(n)[1]
+        if strategy == 4:
+            # PMin: lowest probability over 0
+            return self.lowest_above(0, n)[1]
+
+        # PMed: closest to 50 from below or from above, compared as the scan compares them
+        lo, lo_g = self.highest_below(n // 2 + 1)
+        if lo == 0:
+            lo_g = -1
+        hi, hi_g = self.lowest_above((n - 1) // 2, n)
+        if lo_g < 0 or hi_g < 0:
+            return max(lo_g, hi_g)
+        lo_q, hi_q = abs(prob_beliefs[lo_g] - 50), abs(prob_beliefs[hi_g] - 50)
+        if lo_q != hi_q:
+            return lo_g if lo_q < hi_q else hi_g
+        return min(lo_g, hi_g)
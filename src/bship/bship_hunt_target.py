@@ -0,0 +1,101 @@
+from random import Random
+
+from bship_placements import fleet_cells
+
+# Strategy index of HuntTarget (see BShipModel.translate_strategy)
+HUNT_TARGET = 5
+
+
+class HuntTargetGame:
+    """
+    One game played by the classic hunt/target heuristic, with no beliefs and no BoardFactory
+    Hunting guesses squares on a parity lattice spaced by the smallest ship, which every ship must
+        cross; after a hit, targeting tries the neighbouring squares, extending lines of hits first.
+    Each move is O(1) amortised, so any grid size the GUI allows is cheap. Like RandFast, the
+        game is won when every ship square has been hit.
+    """
+
+    def __init__(self, ships: list, w: int, h: int, ship_descr: tuple, seed=None):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.ships = ships
+        self.ship_squares = set(ships)
+        self.strategy = HUNT_TARGET
+
+        self.trace = {}
+        self.achieved_hits = 0
+        self.guesses = 0
+
+        self.rng = Random(seed)
+        # any shape of two or more squares covers two neighbours, one of each colour
+        parity = min(s if isinstance(s, int) else min(len(s), 2) for s in ship_descr)
+        cells = range(w * h)
+        # squares are popped from the end of these lists
+        self.hunt = [c for c in cells if (c % w + c // w) % parity == 0]
+        self.rest = [c for c in cells if (c % w + c // w) % parity != 0]
+        self.rng.shuffle(self.hunt)
+        self.rng.shuffle(self.rest)
+        self.targets = []
+
+    def test_hit(self, coord: int):
+        return coord in self.ship_squares
+
+    def real_hit(self, coord: int):
+        success = self.test_hit(coord)
+        self.trace[coord] = success
+        self.guesses += 1
+        if success:
+            self.achieved_hits += 1
+            self.add_targets(coord)
+        return success
+
+    def neighbours(self, coord: int) -> list:
+        """
+        In-bounds orthogonal neighbours, as (square, step) pairs
+        """
+        x, y = coord % self.w, coord // self.w
+        result = []
+        if x > 0:
+            result.append((coord - 1, -1))
+        if x < self.w - 1:
+            result.append((coord + 1, 1))
+        if y > 0:
+            result.append((coord - self.w, -self.w))
+        if y < self.h - 1:
+            result.append((coord + self.w, self.w))
+        return result
+
+    def add_targets(self, coord: int) -> None:
+        in_line = []
+        for n, step in self.neighbours(coord):
+            if n in self.trace:
+                continue
+            # the square opposite n is a hit too: n continues a line of hits
+            opposite = coord - step
+            if self.trace.get(opposite) and (opposite, -step) in self.neighbours(coord):
+                in_line.append(n)
+            else:
+                self.targets.append(n)
+        # pushed last, so tried first
+        self.targets += in_line
+
+    def get_best_guess(self) -> int:
+        for pool in (self.targets, self.hunt, self.rest):
+            while pool:
+                g = pool.pop()
+                if g not in self.trace:
+                    return g
+        return -1
+
+    def detect_hit_win(self) -> bool:
+        return self.achieved_hits == fleet_cells(self.shipdescr)
+
+    def detect_il_win(self) -> bool:
+        # without beliefs nothing is deducible before every ship square is hit
+        return self.detect_hit_win()
+
+    def autoplay(self) -> int:
+        while not self.detect_hit_win():
+            self.real_hit(self.get_best_guess())
+        return self.guesses
@@ -0,0 +1,237 @@
+from random import Random
+
+from bship_counting import PlacementCounter
+from bship_game import BShipGame
+from bship_placements import blocking_masks, mask_to_cells, placement_masks
+
+MC_SAMPLES_DEFAULT = 2000
+
+# Metropolis moves applied when deriving a new sample from a surviving one
+MCMC_STEPS = 20
+# Moves applied to a freshly constructed board before it is used, to forget how it was built
+MCMC_BURN_IN = 500
+# Chance that a move relocates two ships at once (lets tightly packed ships swap around)
+PAIR_MOVE_PROB = 0.2
+
+
+def occupancy(state: tuple) -> int:
+    occ = 0
+    for p in state:
+        occ |= p
+    return occ
+
+
+class BoardSampler:
+    """
+    Draws boards uniformly at random, optionally consistent with known hits and misses
+    A board is a state: one placement bitmask per ship, in fleet order. Placements are weighted
+        as in BoardFactory's enumeration, so "uniform" means uniform over its default_boards.
+    With no_touch, ships may not touch each other, even diagonally.
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, rng: Random = None, no_touch: bool = False):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.no_touch = no_touch
+        self.masks = [placement_masks(w, h, s) for s in ship_descr]
+        # the squares a placement needs free of other ships (see blocking_masks())
+        self.blocking = {}
+        for s in ship_descr:
+            self.blocking.update(zip(placement_masks(w, h, s), blocking_masks(w, h, s, no_touch)))
+        self.rng = rng or Random()
+
+    def random_state(self) -> tuple:
+        """
+        Exactly uniform random board with no constraints (rejection sampling)
+        """
+        while True:
+            state = tuple(self.rng.choice(m) for m in self.masks)
+            occ = 0
+            for p in state:
+                if occ & self.blocking[p]:
+                    break
+                occ |= p
+            else:
+                return state
+
+    def random_board(self) -> list:
+        """
+        Uniform random board in BoardFactory's format (a list of occupied squares)
+        """
+        board = []
+        for p in self.random_state():
+            board += mask_to_cells(p)
+        return board
+
+    def consistent_state(self, hit_mask: int, miss_mask: int):
+        """
+        Any board consistent with the hits and misses (randomised backtracking); None if there is none
+        Not uniform: walk() it for a while before treating it as a sample.
+        """
+        lengths = [bin(m[0]).count("1") for m in self.masks]
+        remaining = [sum(lengths[k:]) for k in range(len(lengths))] + [0]
+
+        def place(k, occ, chosen):
+            uncovered = hit_mask & ~occ
+            if uncovered.bit_count() > remaining[k]:
+                return None
+            if k == len(self.masks):
+                return tuple(chosen)
+            candidates = [p for p in self.masks[k] if not (self.blocking[p] & occ or p & miss_mask)]
+            self.rng.shuffle(candidates)
+            # try placements covering known hits first
+            candidates.sort(key=lambda p: -(p & uncovered).bit_count())
+            for p in candidates:
+                found = place(k + 1, occ | p, chosen + [p])
+                if found:
+                    return found
+            return None
+
+        return place(0, 0, [])
+
+    def mcmc_step(self, state: tuple, hit_mask: int, miss_mask: int) -> tuple:
+        """
+        One Metropolis move: relocate one (or two) ships to uniformly chosen placements, and keep
+            the result if it is still a consistent board. The target distribution is uniform.
+        """
+        n = len(state)
+        if n > 1 and self.rng.random() < PAIR_MOVE_PROB:
+            moved = self.rng.sample(range(n), 2)
+        else:
+            moved = [self.rng.randrange(n)]
+
+        new_state = list(state)
+        rest = 0
+        for k in range(n):
+            if k not in moved:
+                rest |= state[k]
+        for k in moved:
+            p = self.rng.choice(self.masks[k])
+            if self.blocking[p] & rest or p & miss_mask:
+                return state
+            rest |= p
+            new_state[k] = p
+        if rest & hit_mask != hit_mask:
+            return state
+        return tuple(new_state)
+
+    def walk(self, state: tuple, steps: int, hit_mask: int, miss_mask: int) -> tuple:
+        for _ in range(steps):
+            state = self.mcmc_step(state, hit_mask, miss_mask)
+        return state
+
+
+class SampledBShipGame(BShipGame):
+    """
+    A Battleship game whose beliefs are a bounded pool of sampled boards instead of every board
+    Hit probabilities are estimated from the pool. After each guess the samples which are still
+        consistent are kept, and the pool is topped up by MCMC moves from the survivors, so no
+        BoardFactory (and no enumeration) is needed: memory is bounded by the number of samples.
+    """
+
+    def __init__(self, ships: list, w: int, h: int, ship_descr: tuple, strategy: int = 0,
+                 samples: int = MC_SAMPLES_DEFAULT, seed=None, no_touch: bool = False):
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.no_touch = no_touch
+        self.n_samples = samples
+        self.hit_mask = 0
+        self.miss_mask = 0
+        # exact counts, built only to confirm a win the samples suggest (see detect_il_win())
+        self.counter = None
+        super().__init__(ships, None, strategy, seed=seed)
+
+    def init_beliefs(self, backend: str = None) -> None:
+        """
+        Fill the pool with (state, occupancy) pairs drawn from every board
+        """
+        self.sampler = BoardSampler(self.w, self.h, self.shipdescr, self.rng, self.no_touch)
+        self.samples = []
+        for _ in range(self.n_samples):
+            state = self.sampler.random_state()
+            self.samples.append((state, occupancy(state)))
+        self.counts = []
+
+    def num_satisfying_boards(self):
+        return len(self.samples)
+
+    def filter_beliefs_by_guess(self, coord: int, success):
+        if self.strategy == 3:
+            return
+
+        bit = 1 << coord
+        if success:
+            self.hit_mask |= bit
+            self.samples = [s for s in self.samples if s[1] & bit]
+        else:
+            self.miss_mask |= bit
+            self.samples = [s for s in self.samples if not s[1] & bit]
+
+        self.replenish()
+        self.update_prob_beliefs()
+
+    def replenish(self) -> None:
+        """
+        Top the pool back up with boards consistent with the trace
+        """
+        if not self.samples:
+            state = self.sampler.consistent_state(self.hit_mask, self.miss_mask)
+            if state is None:
+                raise ValueError("No board is consistent with the trace")
+            state = self.sampler.walk(state, MCMC_BURN_IN, self.hit_mask, self.miss_mask)
+            self.samples.append((state, occupancy(state)))
+
+        survivors = len(self.samples)
+        while len(self.samples) < self.n_samples:
+            parent = self.samples[self.rng.randrange(survivors)][0]
+            state = self.sampler.walk(parent, MCMC_STEPS, self.hit_mask, self.miss_mask)
+            self.samples.append((state, occupancy(state)))
+
+    def guess_data(self, coord: int) -> tuple:
+        n = self.num_satisfying_boards()
+        n_hits = self.counts[coord]
+        return n, n_hits, n - n_hits
+
+    def update_prob_beliefs(self) -> None:
+        """
+        Estimate hit probabilities from the pool, counting every sample's squares once
+        """
+        counts = [0] * (self.w * self.h)
+        for _, occ in self.samples:
+            for c in mask_to_cells(occ):
+                counts[c] += 1
+        self.counts = counts
+        n = len(self.samples)
+        self.prob_beliefs = {g: (counts[g] / n) * 100 for g in range(self.w * self.h)}
+        self.rank_guesses(counts)
+
+    def detect_il_win(self) -> bool:
+        """
+        True once every ship square has been hit, or the trace leaves no doubt about any square
+        The samples agreeing on every square only suggests the latter, as a board none of them
+            happens to be could still disagree, so it is then confirmed by counting exactly.
+        """
+        if self.detect_hit_win():
+            return True
+        if not super().detect_il_win():
+            return False
+        n, counts = self.exact_counts()
+        return all(c in (0, n) for c in counts)
+
+    def exact_counts(self) -> tuple:
+        """
+        (consistent boards, per-square count of them) for the trace, from a PlacementCounter
+        """
+        if self.counter is None:
+            self.counter = PlacementCounter(self.w, self.h, self.shipdescr, self.no_touch)
+        return self.counter.count(self.trace)
+
+    def get_best_guess(self) -> int:
+        if not self.detect_hit_win() and super().detect_il_win():
+            # the samples all agree but the trace leaves some square in doubt (or the game would be
+            # won): guess by the exact probabilities instead
+            n, counts = self.exact_counts()
+            self.prob_beliefs = {g: (counts[g] / n) * 100 for g in range(self.w * self.h)}
+        return super().get_best_guess()
@@ -0,0 +1,179 @@
+import heapq
+import math
+
+from bship_board_factory import BoardFactory
+from bship_placements import mask_to_cells
+
+
+class OptimalSolver:
+    """
+    Computes the true optimal guessing policy for a (small) board: the minimum expected, or
+        worst-case, number of guesses to reach the detect_il_win condition.
+    Boards covering the same squares are indistinguishable, so a belief state is the set of
+        distinct configurations still possible, held as a bitmask over configurations (a canonical,
+        hashable key). Boards are weighted by how many enumerated boards share a configuration.
+    The search memoises every belief state and prunes guesses whose lower bound (Huffman code
+        length for the expected cost, log2 of the number of configurations for the worst case)
+        cannot beat the best guess found so far.
+    """
+
+    def __init__(self, bf: BoardFactory):
+        self.bf = bf
+        self.cells = bf.w * bf.h
+
+        config_ids = {}
+        self.board_config = []
+        self.weights = []
+        for board in bf.default_boards:
+            key = frozenset(board)
+            if key not in config_ids:
+                config_ids[key] = len(self.weights)
+                self.weights.append(0)
+            i = config_ids[key]
+            self.weights[i] += 1
+            self.board_config.append(i)
+
+        # for each square, the configurations containing it
+        self.containing = [0] * self.cells
+        for key, i in config_ids.items():
+            for c in key:
+                self.containing[c] |= 1 << i
+
+        self.all_configs = (1 << len(self.weights)) - 1
+        self.mean_memo = {}
+        self.worst_memo = {}
+
+    def weight(self, state: int) -> int:
+        return sum(self.weights[i] for i in mask_to_cells(state))
+
+    def splits(self, state: int) -> list:
+        """
+        The distinct informative guesses from state, as (square, hit state, miss state)
+        """
+        seen = set()
+        splits = []
+        for c in range(self.cells):
+            hit_state = state & self.containing[c]
+            if hit_state == 0 or hit_state == state or hit_state in seen:
+                continue
+            seen.add(hit_state)
+            splits.append((c, hit_state, state & ~hit_state))
+        return splits
+
+    def huffman_bound(self, state: int) -> int:
+        """
+        Least total guesses over all boards of state for any binary decision tree (Huffman cost)
+        """
+        heap = [self.weights[i] for i in mask_to_cells(state)]
+        if len(heap) < 2:
+            return 0
+        heapq.heapify(heap)
+        total = 0
+        while len(heap) > 1:
+            merged = heapq.heappop(heap) + heapq.heappop(heap)
+            total += merged
+            heapq.heappush(heap, merged)
+        return total
+
+    def total_cost(self, state: int) -> int:
+        """
+        Minimum total number of guesses, summed over every board of state (an exact integer)
+        """
+        if state & (state - 1) == 0:
+            return 0
+        memoised = self.mean_memo.get(state)
+        if memoised is not None:
+            return memoised[0]
+
+        w = self.weight(state)
+        bound = self.huffman_bound(state)
+        candidates = self.splits(state)
+        # balanced guesses first, they are usually best and tighten the pruning soonest
+        candidates.sort(key=lambda s: abs(2 * self.weight(s[1]) - w))
+
+        best, best_c = math.inf, -1
+        for c, hit_state, miss_state in candidates:
+            if w + self.huffman_bound(hit_state) + self.huffman_bound(miss_state) >= best:
+                continue
+            cost = w + self.total_cost(hit_state) + self.total_cost(miss_state)
+            if cost < best:
+                best, best_c = cost, c
+                if best <= bound:
+                    break
+
+        self.mean_memo[state] = (best, best_c)
+        return best
+
+    def worst_case(self, state: int) -> int:
+        """
+        Minimum over policies of the maximum number of guesses for any board of state
+        """
+        if state & (state - 1) == 0:
+            return 0
+        memoised = self.worst_memo.get(state)
+        if memoised is not None:
+            return memoised[0]
+
+        bound = math.ceil(math.log2(state.bit_count()))
+        candidates = self.splits(state)
+        candidates.sort(key=lambda s: abs(2 * s[1].bit_count() - state.bit_count()))
+
+        best, best_c = math.inf, -1
+        for c, hit_state, miss_state in candidates:
+            lower = 1 + math.ceil(math.log2(max(hit_state.bit_count(), miss_state.bit_count())))
+            if lower >= best:
+                continue
+            depth = 1 + max(self.worst_case(hit_state), self.worst_case(miss_state))
+            if depth < best:
+                best, best_c = depth, c
+                if best <= bound:
+                    break
+
+        self.worst_memo[state] = (best, best_c)
+        return best
+
+    def solve(self) -> dict:
+        """
+        Optimal average and worst-case scores over every board of the factory
+        """
+        return {
+            "mean": self.total_cost(self.all_configs) / len(self.bf.default_boards),
+            "worst": self.worst_case(self.all_configs),
+        }
+
+    def best_guess(self, state: int, worst_case: bool = False) -> int:
+        """
+        The optimal guess from a belief state (-1 once the game is won)
+        """
+        if worst_case:
+            self.worst_case(state)
+            memo = self.worst_memo
+        else:
+            self.total_cost(state)
+            memo = self.mean_memo
+        return memo[state][1] if state in memo else -1
+
+    def state_of(self, backend, beliefs) -> int:
+        """
+        Belief state of a state of a belief backend (e.g. BShipGame.backend and BShipGame.beliefs)
+        """
+        state = 0
+        for i in backend.iter_indices(beliefs):
+            state |= 1 << self.board_config[i]
+        return state
+
+    def play(self, board_index: int, worst_case: bool = False) -> int:
+        """
+        Play the optimal policy against a board; returns the number of guesses
+        """
+        config = 1 << self.board_config[board_index]
+        state = self.all_configs
+        guesses = 0
+        while state & (state - 1):
+            c = self.best_guess(state, worst_case)
+            if self.containing[c] & config:
+                state &= self.containing[c]
+            else:
+                state &= ~self.containing[c]
+            guesses += 1
+        return guesses
@@ -0,0 +1,112 @@
+import threading
+from array import array
+
+from bship_board_factory import BoardFactory
+from bship_experiment import EXPERIMENT_SEED, play_board
+from bship_game import board_seed
+from bship_results import read_results
+
+# Par is the score of PMed on the board being played
+PAR_STRATEGY = 0
+
+UNSCORED = -1
+
+
+class ParTable:
+    """
+    Score of the reference strategy on every board of a factory, by board index
+    Filled in the background (fill_in_background()), from an experiment as it runs (record())
+        or from its results file (load_results()); a board not scored yet is played on demand.
+    Also answers which boards are hardest and easiest for the strategy.
+    """
+
+    def __init__(self, bf: BoardFactory, strat: int = PAR_STRATEGY):
+        self.bf = bf
+        self.strat = strat
+        self.scores = array('i', [UNSCORED]) * len(bf.default_boards)
+        self.n_scored = 0
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.thread = None
+
+    def record(self, board_index: int, score: int) -> None:
+        with self.lock:
+            if self.scores[board_index] == UNSCORED:
+                self.n_scored += 1
+            self.scores[board_index] = score
+
+    def score(self, board_index: int):
+        """
+        The board's score if known, else None
+        """
+        score = self.scores[board_index]
+        return None if score == UNSCORED else score
+
+    def play(self, board_index: int) -> int:
+        bg = play_board(self.bf, self.bf.default_boards[board_index], self.strat,
+                        seed=board_seed(EXPERIMENT_SEED, board_index))
+        self.record(board_index, bg.guesses)
+        return bg.guesses
+
+    def par(self, board_index: int) -> int:
+        """
+        Par for a board: a lookup, unless the board hasn't been scored yet
+        """
+        score = self.score(board_index)
+        return self.play(board_index) if score is None else score
+
+    def complete(self) -> bool:
+        return self.n_scored == len(self.scores)
+
+    def fill(self, start: int = 0, stop: int = None) -> None:
+        """
+        Score every unscored board in [start, stop), until stop() is called
+        """
+        if stop is None:
+            stop = len(self.scores)
+        for i in range(start, stop):
+            if self._stop_event.is_set():
+                return
+            if self.scores[i] == UNSCORED:
+                self.play(i)
+
+    def fill_in_background(self) -> threading.Thread:
+        if self.thread is not None and self._stop_event.is_set():
+            # a fill that was just stopped finishes its current board before we start again
+            self.thread.join()
+        if self.thread is None or not self.thread.is_alive():
+            self._stop_event.clear()
+            self.thread = threading.Thread(target=self.fill, daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def load_results(self, path: str) -> None:
+        """
+        Fill in scores from the results file of an experiment with the same factory and strategy
+        """
+        for board_index, score, _ in read_results(path):
+            if board_index < len(self.scores):
+                self.record(board_index, score)
+
+    def worst(self) -> tuple:
+        """
+        (board index, score) of the highest scoring board found so far, or (-1, None)
+        """
+        best_i, best_score = -1, None
+        for i, score in enumerate(self.scores):
+            if score != UNSCORED and (best_score is None or score > best_score):
+                best_i, best_score = i, score
+        return best_i, best_score
+
+    def best(self) -> tuple:
+        """
+        (board index, score) of the lowest scoring board found so far, or (-1, None)
+        """
+        best_i, best_score = -1, None
+        for i, score in enumerate(self.scores):
+            if score != UNSCORED and (best_score is None or score < best_score):
+                best_i, best_score = i, score
+        return best_i, best_score
@@ -0,0 +1,168 @@
+from functools import lru_cache
+
+# Some ready-made shapes, as (x, y) cells
+L_SHAPE = ((0, 0), (0, 1), (0, 2), (1, 2))
+T_SHAPE = ((0, 0), (1, 0), (2, 0), (1, 1))
+SQUARE_SHAPE = ((0, 0), (1, 0), (0, 1), (1, 1))
+
+
+@lru_cache(maxsize=None)
+def straight_placements(w: int, h: int, ship: int) -> tuple:
+    """
+    All in-bounds placements of a straight ship, as tuples of scalar coordinates
+    Ordered by root square, horizontal before vertical, and duplicated for ships of length 1
+        (which fit "both ways"), as the original enumeration always has been.
+    """
+    placements = []
+    for root in range(w * h):
+        x, y = root % w, root // w
+        if x + ship <= w:
+            placements.append(tuple(root + i for i in range(ship)))
+        if y + ship <= h:
+            placements.append(tuple(root + (i * w) for i in range(ship)))
+    return tuple(placements)
+
+
+def normalise_shape(cells) -> tuple:
+    """
+    A shape's (x, y) cells translated to touch both axes, in row-major order
+    """
+    min_x = min(x for x, _ in cells)
+    min_y = min(y for _, y in cells)
+    return tuple(sorted(((x - min_x, y - min_y) for x, y in cells), key=lambda c: (c[1], c[0])))
+
+
+@lru_cache(maxsize=None)
+def shape_orientations(shape: tuple) -> tuple:
+    """
+    The distinct quarter-turn rotations of a shape, starting with the shape itself
+    """
+    orientations = []
+    cells = normalise_shape(shape)
+    for _ in range(4):
+        if cells not in orientations:
+            orientations.append(cells)
+        cells = normalise_shape([(y, -x) for x, y in cells])
+    return tuple(orientations)
+
+
+def as_ship(ship):
+    """
+    A ship in canonical form: an int (length of a straight ship) or a tuple of (x, y) cells,
+        e.g. after a round trip through JSON has turned it into lists
+    """
+    if isinstance(ship, int):
+        return ship
+    return tuple(tuple(c) for c in ship)
+
+
+def normalise_fleet(ship_descr) -> tuple:
+    return tuple(as_ship(s) for s in ship_descr)
+
+
+def ship_size(ship) -> int:
+    """
+    Number of squares a ship covers
+    """
+    return ship if isinstance(ship, int) else len(ship)
+
+
+def fleet_cells(ship_descr: tuple) -> int:
+    """
+    Number of squares covered by the whole fleet: all of them must be hit to sink it
+    """
+    return sum(ship_size(s) for s in ship_descr)
+
+
+def fleet_name(ship_descr: tuple) -> str:
+    """
+    A fleet as text safe for file names, e.g. "2-3-P0.0_0.1_0.2_1.2" for ships 2, 3 and an L
+    """
+    return "-".join(str(s) if isinstance(s, int) else "P" + "_".join(f"{x}.{y}" for x, y in s)
+                    for s in ship_descr)
+
+
+@lru_cache(maxsize=None)
+def ship_placements(w: int, h: int, ship) -> tuple:
+    """
+    All in-bounds placements of a ship as tuples of scalar coordinates
+    A ship is an int (a straight ship of that length, see straight_placements()) or a shape:
+        a tuple of (x, y) cells, placed in each of its rotations with the top left of its
+        bounding box at each square in turn.
+    """
+    if isinstance(ship, int):
+        return straight_placements(w, h, ship)
+
+    placements = []
+    orientations = shape_orientations(ship)
+    for root in range(w * h):
+        rx, ry = root % w, root // w
+        for cells in orientations:
+            if all(rx + x < w and ry + y < h for x, y in cells):
+                placements.append(tuple(root + x + (y * w) for x, y in cells))
+    return tuple(placements)
+
+
+@lru_cache(maxsize=None)
+def placement_masks(w: int, h: int, ship) -> tuple:
+    """
+    Placements of a ship as integer bitmasks (bit i set <=> square i occupied)
+    """
+    return tuple(cells_to_mask(p) for p in ship_placements(w, h, ship))
+
+
+def neighbourhood(mask: int, w: int, h: int) -> int:
+    """
+    The squares of mask together with all their neighbours, diagonals included
+    """
+    left_column = sum(1 << (y * w) for y in range(h))
+    right_column = left_column << (w - 1)
+    row = mask | (mask & ~right_column) << 1 | (mask & ~left_column) >> 1
+    return (row | row << w | row >> w) & ((1 << (w * h)) - 1)
+
+
+@lru_cache(maxsize=None)
+def halo_masks(w: int, h: int, ship) -> tuple:
+    """
+    For each placement of placement_masks(), the squares no other ship may occupy when ships
+        must not touch: the placement and every square around it
+    """
+    return tuple(neighbourhood(m, w, h) for m in placement_masks(w, h, ship))
+
+
+def blocking_masks(w: int, h: int, ship, no_touch: bool = False) -> tuple:
+    """
+    For each placement of placement_masks(), the squares that must be free of other ships for it
+        to be legal: a placement fits around the occupied squares occ iff not blocking & occ
+    """
+    return halo_masks(w, h, ship) if no_touch else placement_masks(w, h, ship)
+
+
+def cells_to_mask(cells) -> int:
+    mask = 0
+    for c in cells:
+        mask |= 1 << c
+    return mask
+
+
+def mask_to_cells(mask: int) -> list:
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+def trace_masks(trace: dict) -> tuple:
+    """
+    (hit mask, miss mask) of a game trace
+    """
+    hit_mask = 0
+    miss_mask = 0
+    for coord, hit in trace.items():
+        if hit:
+            hit_mask |= 1 << coord
+        else:
+            miss_mask |= 1 << coord
+    return hit_mask, miss_mask
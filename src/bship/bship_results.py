@@ -0,0 +1,152 @@
+import math
+import os
+import struct
+
+# One record per board: board index, score (guesses to win), hits among those guesses
+RESULT_RECORD = struct.Struct('<IHH')
+RESULTS_READ_CHUNK = 4096
+
+
+class ResultsCollector:
+    """
+    Streaming statistics over experiment scores, in constant memory
+    The histogram has one entry per distinct score, which is bounded by the number of squares
+        for every strategy that does not repeat guesses.
+    Optionally writes a compact binary record per board to disk (see read_results()).
+    """
+
+    def __init__(self, path: str = None):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = {}
+
+        self.max_score = None
+        self.min_score = None
+        self.worst_index = -1
+        self.best_index = -1
+
+        self.path = path
+        self.out = open(path, 'wb') if path else None
+
+    def add(self, board_index: int, score: int, hits: int = 0) -> None:
+        """
+        Record the result of one board (Welford's update for the running variance)
+        """
+        self.n += 1
+        delta = score - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (score - self.mean)
+        self.histogram[score] = self.histogram.get(score, 0) + 1
+
+        if self.max_score is None or score > self.max_score:
+            self.max_score = score
+            self.worst_index = board_index
+        if self.min_score is None or score < self.min_score:
+            self.min_score = score
+            self.best_index = board_index
+
+        if self.out:
+            self.out.write(RESULT_RECORD.pack(board_index, score, hits))
+
+    def merge(self, other: 'ResultsCollector') -> None:
+        """
+        Fold another collector's statistics into this one (records on disk are not merged)
+        """
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n = n
+        for score, count in other.histogram.items():
+            self.histogram[score] = self.histogram.get(score, 0) + count
+
+        if self.max_score is None or other.max_score > self.max_score:
+            self.max_score = other.max_score
+            self.worst_index = other.worst_index
+        if self.min_score is None or other.min_score < self.min_score:
+            self.min_score = other.min_score
+            self.best_index = other.best_index
+
+    def variance(self) -> float:
+        """
+        Sample variance of the scores
+        """
+        if self.n < 2:
+            return 0.0
+        return self.m2 / (self.n - 1)
+
+    def std(self) -> float:
+        return math.sqrt(self.variance())
+
+    def percentile(self, pct: float) -> int:
+        """
+        Nearest-rank percentile (0 < pct <= 100) of the scores, read off the histogram
+        """
+        if self.n == 0:
+            return 0
+        rank = max(1, math.ceil(self.n * pct / 100))
+        seen = 0
+        for score in sorted(self.histogram):
+            seen += self.histogram[score]
+            if seen >= rank:
+                return score
+        return self.max_score
+
+    def summary(self) -> dict:
+        return {
+            "n": self.n,
+            "mean": self.mean,
+            "std": self.std(),
+            "min": self.min_score,
+            "median": self.percentile(50),
+            "p90": self.percentile(90),
+            "max": self.max_score,
+            "worst_index": self.worst_index,
+        }
+
+    def flush(self) -> None:
+        if self.out:
+            self.out.flush()
+
+    def close(self) -> None:
+        if self.out:
+            self.out.close()
+            self.out = None
+
+    def reopen(self) -> None:
+        """
+        Continue writing records after being restored from a checkpoint
+        Records written after the checkpoint was taken are discarded, since those boards are replayed.
+        Raises ValueError if the file no longer holds a record for every board counted so far:
+            the missing records can't be recovered, so the experiment must start again.
+        """
+        if not self.path:
+            return
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size < self.n * RESULT_RECORD.size:
+            raise ValueError(f"{self.path} holds {size // RESULT_RECORD.size} of {self.n} records")
+        self.out = open(self.path, 'r+b')
+        self.out.truncate(self.n * RESULT_RECORD.size)
+        self.out.seek(0, os.SEEK_END)
+
+    def __getstate__(self):
+        # open files can't be pickled; see reopen()
+        state = self.__dict__.copy()
+        state["out"] = None
+        return state
+
+
+def read_results(path: str):
+    """
+    Generator over the (board_index, score, hits) records of a results file
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(RESULT_RECORD.size * RESULTS_READ_CHUNK)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % RESULT_RECORD.size
+            yield from RESULT_RECORD.iter_unpack(chunk[:usable])
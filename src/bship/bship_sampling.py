@@ -0,0 +1,168 @@
+import math
+from random import Random
+from statistics import NormalDist
+
+from bship_board_factory import BoardFactory
+from bship_experiment import play_board
+from bship_game import board_seed
+from bship_results import ResultsCollector
+
+CONFIDENCE_DEFAULT = 0.95
+PRECISION_DEFAULT = 0.1
+
+# The normal approximation is poor below this many samples, so never stop earlier
+MIN_SAMPLES = 30
+
+# Sequential runs only look at their interval after MIN_SAMPLES, 2 * MIN_SAMPLES, 4 * MIN_SAMPLES...
+#     samples, and look k may be wrong with probability alpha / 2 ** (k + 1) (alpha = 1 - confidence).
+#     These add up to less than alpha over all looks, so whichever look stops the run, its
+#     interval still has the stated confidence; checking at the plain confidence after every
+#     sample would stop early on a chance fluctuation far more often than 1 - confidence suggests.
+LOOK_GROWTH = 2
+
+
+def z_value(confidence: float) -> float:
+    """
+    Two-sided critical value of the standard normal distribution
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def half_width(results: ResultsCollector, confidence: float = CONFIDENCE_DEFAULT) -> float:
+    """
+    Half-width of the confidence interval of the mean score (inf until there are two samples)
+    """
+    if results.n < 2:
+        return math.inf
+    return z_value(confidence) * results.std() / math.sqrt(results.n)
+
+
+def confidence_interval(results: ResultsCollector, confidence: float = CONFIDENCE_DEFAULT) -> tuple:
+    hw = half_width(results, confidence)
+    return results.mean - hw, results.mean + hw
+
+
+def looks_before(n: int) -> int:
+    """
+    Number of scheduled looks at or before n samples
+    """
+    looks, at = 0, MIN_SAMPLES
+    while at <= n:
+        looks += 1
+        at *= LOOK_GROWTH
+    return looks
+
+
+def is_look(n: int) -> bool:
+    """
+    True if a sequential run looks at its interval after n samples
+    """
+    at = MIN_SAMPLES
+    while at < n:
+        at *= LOOK_GROWTH
+    return at == n
+
+
+def look_confidence(confidence: float, n: int) -> float:
+    """
+    Confidence to compute the interval at after n samples: that of the look at n, or of one more
+        look if the run stopped between looks (e.g. at max_samples)
+    """
+    look = looks_before(n) - 1 if is_look(n) else looks_before(n)
+    return 1 - (1 - confidence) / 2 ** (look + 1)
+
+
+class SequentialSampler:
+    """
+    Plays boards drawn uniformly at random (with replacement) until the mean score is known
+        to within +/- precision at the given confidence, or max_samples boards have been played.
+    The interval is only checked on the schedule of looks (see LOOK_GROWTH), at the confidence
+        spent on that look.
+    """
+
+    def __init__(self, bf: BoardFactory, strat: int, precision: float = PRECISION_DEFAULT,
+                 confidence: float = CONFIDENCE_DEFAULT, max_samples: int = None, seed=None):
+        self.bf = bf
+        self.strat = strat
+        self.precision = precision
+        self.confidence = confidence
+        self.max_samples = max_samples if max_samples is not None else len(bf.default_boards)
+        self.seed = seed
+        self.rng = Random(seed)
+        self.results = ResultsCollector()
+
+    def draw(self) -> int:
+        return self.rng.randrange(len(self.bf.default_boards))
+
+    def step(self, on_guess=None) -> int:
+        """
+        Play one random board; returns its index
+        """
+        i = self.draw()
+        bg = play_board(self.bf, self.bf.default_boards[i], self.strat, on_guess,
+                        seed=board_seed(self.seed, self.results.n))
+        self.results.add(i, bg.guesses, bg.achieved_hits)
+        return i
+
+    def half_width(self) -> float:
+        return half_width(self.results, look_confidence(self.confidence, self.results.n))
+
+    def interval(self) -> tuple:
+        return confidence_interval(self.results, look_confidence(self.confidence, self.results.n))
+
+    def done(self) -> bool:
+        if self.results.n >= self.max_samples:
+            return True
+        return is_look(self.results.n) and self.half_width() <= self.precision
+
+    def run(self) -> ResultsCollector:
+        while not self.done():
+            self.step()
+        return self.results
+
+
+def compare_strategies(bf: BoardFactory, strat_a: int, strat_b: int, confidence: float = CONFIDENCE_DEFAULT,
+                       precision: float = PRECISION_DEFAULT, max_samples: int = None, seed=None) -> dict:
+    """
+    Paired sequential comparison: both strategies play the same random boards until the
+        confidence interval of the mean score difference (a - b) either excludes zero, or is
+        narrower than +/- precision (the strategies are equivalent to within precision).
+    The interval is only checked on the schedule of looks (see LOOK_GROWTH), at the confidence
+        spent on that look; the returned interval is at that confidence too.
+    The verdict is the strategy index with the lower mean score, "tie", or "undecided" if
+        max_samples ran out first.
+    """
+    if max_samples is None:
+        max_samples = len(bf.default_boards)
+    rng = Random(seed)
+    results_a = ResultsCollector()
+    results_b = ResultsCollector()
+    diff = ResultsCollector()
+
+    verdict = "undecided"
+    while diff.n < max_samples:
+        i = rng.randrange(len(bf.default_boards))
+        board = bf.default_boards[i]
+        score_a = play_board(bf, board, strat_a, seed=board_seed(seed, diff.n)).guesses
+        score_b = play_board(bf, board, strat_b, seed=board_seed(seed, diff.n)).guesses
+        results_a.add(i, score_a)
+        results_b.add(i, score_b)
+        diff.add(i, score_a - score_b)
+
+        if not is_look(diff.n):
+            continue
+        lo, hi = confidence_interval(diff, look_confidence(confidence, diff.n))
+        if lo > 0 or hi < 0:
+            verdict = strat_a if hi < 0 else strat_b
+            break
+        if hi - lo <= 2 * precision:
+            verdict = "tie"
+            break
+
+    return {
+        "a": results_a,
+        "b": results_b,
+        "diff": diff,
+        "interval": confidence_interval(diff, look_confidence(confidence, diff.n)),
+        "verdict": verdict,
+    }
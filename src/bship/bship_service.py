@@ -0,0 +1,264 @@
+"""
+Local solver service, for driving the solver from other programs (bots, dashboards) without Qt
+
+Clients connect over TCP or a Unix socket and exchange newline-delimited JSON. Every request
+carries an id, which its response echoes; requests on one connection are served concurrently,
+so responses may come back in any order.
+
+    {"id": 1, "method": "hint", "params": {"w": 5, "h": 5, "fleet": [2, 3], "strategy": 0,
+                                           "trace": [[12, true], [7, false]]}}
+    -> {"id": 1, "result": {"guess": 13, "probabilities": [...], "candidates": 40, "won": false}}
+
+    {"id": 2, "method": "experiment", "params": {"w": 4, "h": 4, "fleet": [2, 3], "strategy": 1}}
+    -> {"id": 2, "result": {"job": 1}}
+    {"id": 3, "method": "progress", "params": {"job": 1}}
+    -> {"id": 3, "result": {"state": "running", "done": 120, "total": 264, "summary": {...}}}
+
+    {"id": 4, "method": "cancel", "params": {"job": 1}}
+
+A job is forgotten once a progress (or cancel) response has reported it complete, cancelled or
+failed, so fetch its final summary then.
+
+A fleet entry is a ship length, or a shape as a list of [x, y] cells (see ship_placements()).
+"no_touch": true in hint or experiment params forbids ships from touching, even diagonally.
+Errors come back as {"id": ..., "error": message}. Factories stay built between requests (see
+FactoryCache), and all CPU-heavy work runs in executor threads so the event loop keeps answering.
+
+    python bship_service.py --port 5556
+    python bship_service.py --unix /tmp/bship.sock
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bship_experiment import EXPERIMENT_SEED, STRATEGY_NAMES, play_board
+from bship_factory_cache import FactoryCache
+from bship_game import BShipGame, board_seed
+from bship_hunt_target import HUNT_TARGET
+from bship_placements import normalise_fleet
+from bship_results import ResultsCollector
+
+DEFAULT_PORT = 5556
+
+HINT_WORKERS = 4
+# Experiments get their own threads, so long jobs never hold up hints
+EXPERIMENT_WORKERS = 2
+
+# Strategies that can suggest a guess from a trace alone
+HINT_STRATEGIES = (0, 1, 4)
+
+# States of a job that will make no more progress
+FINISHED_STATES = ("complete", "cancelled", "failed")
+# A finished job is dropped once its final progress has been fetched; at most this many are kept
+#     for clients which never fetch it, the oldest going first
+MAX_FINISHED_JOBS = 100
+
+
+class ExperimentJob:
+    """
+    An experiment running in the background, polled for progress
+    """
+
+    def __init__(self, job_id: int, w: int, h: int, ship_descr: tuple, strat: int, no_touch: bool = False):
+        self.id = job_id
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.no_touch = no_touch
+        self.strat = strat
+        self.state = "queued"
+        self.error = None
+        self.total = 0
+        self.results = ResultsCollector()
+        self._stop_event = threading.Event()
+
+    def run(self, factories: FactoryCache) -> None:
+        if self._stop_event.is_set():
+            # cancelled while queued
+            self.state = "cancelled"
+            return
+        try:
+            self.state = "building"
+            bf = factories.get(self.w, self.h, self.shipdescr, self.no_touch)
+            self.total = len(bf.default_boards)
+            self.state = "running"
+            for i, board in enumerate(bf.default_boards):
+                if self._stop_event.is_set():
+                    self.state = "cancelled"
+                    return
+                bg = play_board(bf, board, self.strat, seed=board_seed(EXPERIMENT_SEED, i))
+                self.results.add(i, bg.guesses, bg.achieved_hits)
+            self.state = "complete"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+
+    def cancel(self) -> None:
+        self._stop_event.set()
+
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def progress(self) -> dict:
+        progress = {"state": self.state, "done": self.results.n, "total": self.total,
+                    "strategy": STRATEGY_NAMES.get(self.strat, self.strat)}
+        if self.results.n:
+            progress["summary"] = self.results.summary()
+        if self.error:
+            progress["error"] = self.error
+        return progress
+
+
+class SolverService:
+    """
+    The request handlers, and the warm factories and jobs they share
+    """
+
+    def __init__(self, hint_workers: int = HINT_WORKERS, experiment_workers: int = EXPERIMENT_WORKERS):
+        self.factories = FactoryCache()
+        self.hint_executor = ThreadPoolExecutor(hint_workers)
+        self.experiment_executor = ThreadPoolExecutor(experiment_workers)
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.methods = {
+            "hint": self.hint,
+            "experiment": self.experiment,
+            "progress": self.progress,
+            "cancel": self.cancel,
+            "strategies": self.strategies,
+        }
+
+    async def hint(self, params: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.hint_executor, self.compute_hint, params)
+
+    def compute_hint(self, params: dict) -> dict:
+        """
+        Best guess and probability map after a trace of [square, hit] pairs
+        """
+        strat = params.get("strategy", 0)
+        if strat not in HINT_STRATEGIES:
+            raise ValueError(f"Strategy {strat} gives no hints")
+        bf = self.factories.get(params["w"], params["h"], normalise_fleet(params["fleet"]),
+                                bool(params.get("no_touch")))
+
+        # filter the candidates first: a game computes probabilities, which needs at least one
+        trace = [(coord, bool(hit)) for coord, hit in params.get("trace", [])]
+        backend = bf.get_backend()
+        state = backend.initialize()
+        for coord, hit in trace:
+            if not 0 <= coord < bf.w * bf.h:
+                raise ValueError(f"Square {coord} is off the board")
+            state = backend.observe(state, coord, hit)
+        if backend.candidate_count(state) == 0:
+            raise ValueError("No board is consistent with the trace" if trace else "The fleet doesn't fit")
+
+        bg = BShipGame([], bf, strat)
+        for coord, hit in trace:
+            bg.observe(coord, hit)
+
+        return {
+            "guess": bg.get_best_guess(),
+            "probabilities": [bg.prob_beliefs[g] for g in range(bf.w * bf.h)],
+            "candidates": bg.num_satisfying_boards(),
+            "won": bg.detect_il_win(),
+        }
+
+    async def experiment(self, params: dict) -> dict:
+        strat = params.get("strategy", 0)
+        if strat not in STRATEGY_NAMES or strat == HUNT_TARGET:
+            raise ValueError(f"Strategy {strat} can't run as an experiment")
+        job = ExperimentJob(next(self.job_ids), params["w"], params["h"], normalise_fleet(params["fleet"]), strat,
+                            bool(params.get("no_touch")))
+        self.jobs[job.id] = job
+        self.drop_finished_jobs()
+        asyncio.get_running_loop().run_in_executor(self.experiment_executor, job.run, self.factories)
+        return {"job": job.id}
+
+    async def progress(self, params: dict) -> dict:
+        return self.fetch_progress(self.job(params))
+
+    async def cancel(self, params: dict) -> dict:
+        job = self.job(params)
+        job.cancel()
+        return self.fetch_progress(job)
+
+    def job(self, params: dict) -> ExperimentJob:
+        job = self.jobs.get(params["job"])
+        if job is None:
+            raise ValueError(f"No job {params['job']} (finished jobs are dropped once fetched)")
+        return job
+
+    def fetch_progress(self, job: ExperimentJob) -> dict:
+        """
+        The job's progress, dropping the job if this is its final progress
+        """
+        progress = job.progress()
+        if job.finished():
+            self.jobs.pop(job.id, None)
+        return progress
+
+    def drop_finished_jobs(self) -> None:
+        """
+        Keep at most MAX_FINISHED_JOBS finished jobs nobody has fetched, dropping the oldest
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def strategies(self, params: dict) -> dict:
+        return {str(s): name for s, name in STRATEGY_NAMES.items()}
+
+    async def handle_request(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = self.methods[request["method"]]
+            response = {"id": request_id, "result": await method(request.get("params", {}))}
+        except KeyError as e:
+            response = {"id": request_id, "error": f"Missing or unknown {e}"}
+        except (ValueError, TypeError) as e:
+            response = {"id": request_id, "error": str(e)}
+        except Exception as e:
+            # whatever went wrong, the client gets an answer rather than waiting forever
+            response = {"id": request_id, "error": f"{type(e).__name__}: {e}"}
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self.handle_request(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, unix_path: str = None) -> None:
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        print("Serving on", ", ".join(str(s.getsockname()) for s in server.sockets))
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local battleship solver service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket instead of TCP")
+    args = parser.parse_args()
+    asyncio.run(SolverService().serve(args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
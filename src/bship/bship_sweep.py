@@ -0,0 +1,172 @@
+import argparse
+import csv
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bship_counting import PlacementCounter
+from bship_experiment import EXPERIMENT_SEED, STRATEGY_NAMES, play_board
+from bship_factory_cache import FactoryCache
+from bship_game import board_seed
+from bship_placements import fleet_name, ship_placements
+from bship_results import ResultsCollector
+
+# Board counts are computed exactly up to this many squares, and bounded above beyond it: an exact
+#     count of a larger grid with a big fleet can take a minute, just to schedule the sweep
+EXACT_COUNT_CELLS = 25
+
+TABLE_COLUMNS = ["w", "h", "fleet", "strategy", "boards", "mean", "std", "median", "p90", "max",
+                 "worst_index", "seconds"]
+
+# One per worker process, so jobs sharing (w, h, fleet) reuse built factories. A factory is only
+#     ever derived from a prefix of its fleet (see FactoryCache.find_base()), so its boards are in
+#     fresh enumeration order whatever this process ran before, and every row is reproducible.
+_factories = FactoryCache()
+
+
+def sweep_jobs(widths, heights, fleets, strategies) -> list:
+    """
+    Every combination of the configuration matrix, as (w, h, fleet, strategy) jobs
+    """
+    return [(w, h, tuple(fleet), strat)
+            for w in widths for h in heights for fleet in fleets for strat in strategies]
+
+
+def estimate_boards(w: int, h: int, fleet: tuple) -> int:
+    """
+    Number of boards of a configuration: exact on small grids, else the product of each
+        ship's placement count (an upper bound ignoring overlaps)
+    """
+    if w * h <= EXACT_COUNT_CELLS:
+        return PlacementCounter(w, h, fleet).count()[0]
+    return math.prod(len(ship_placements(w, h, s)) for s in fleet)
+
+
+def estimate_cost(w: int, h: int, n_boards: int) -> int:
+    """
+    Relative cost of enumerating, or of playing every board once: each touches every square of
+        every board
+    """
+    return n_boards * w * h
+
+
+class SweepScheduler:
+    """
+    Runs a whole study (a matrix of grid sizes, fleets and strategies) on a process pool
+    Jobs sharing (w, h, fleet) are packed into one task so the factory is built once; tasks are
+        submitted longest first (LPT list scheduling), and a group too big to balance is split
+        by strategy across workers.
+    """
+
+    def __init__(self, jobs: list, workers: int = None, max_boards: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.jobs = jobs
+        self.skipped = []
+
+        groups = {}
+        self.boards = {}
+        for w, h, fleet, strat in jobs:
+            key = (w, h, fleet)
+            if key not in self.boards:
+                self.boards[key] = estimate_boards(w, h, fleet)
+            if max_boards is not None and self.boards[key] > max_boards:
+                self.skipped.append((w, h, fleet, strat))
+                continue
+            groups.setdefault(key, []).append(strat)
+
+        self.tasks = self.pack(groups)
+
+    def pack(self, groups: dict) -> list:
+        """
+        Tasks of (w, h, fleet, strategies, estimated cost), longest first
+        """
+        costs = {}
+        for (w, h, fleet), strats in groups.items():
+            unit = estimate_cost(w, h, self.boards[(w, h, fleet)])
+            costs[(w, h, fleet)] = unit * (1 + len(strats))
+        share = sum(costs.values()) / self.workers if costs else 0
+
+        tasks = []
+        for (w, h, fleet), strats in groups.items():
+            unit = estimate_cost(w, h, self.boards[(w, h, fleet)])
+            if costs[(w, h, fleet)] > share and len(strats) > 1:
+                tasks += [(w, h, fleet, (s,), 2 * unit) for s in strats]
+            else:
+                tasks.append((w, h, fleet, tuple(strats), costs[(w, h, fleet)]))
+        tasks.sort(key=lambda t: t[4], reverse=True)
+        return tasks
+
+    def run(self, out_path: str = None) -> list:
+        """
+        Run every task and return (and optionally write as CSV) one table row per job
+        """
+        rows = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(run_task, w, h, fleet, strats) for w, h, fleet, strats, _ in self.tasks]
+            for future in futures:
+                rows += future.result()
+
+        # back into the order of the configuration matrix
+        order = {job: i for i, job in enumerate(self.jobs)}
+        rows.sort(key=lambda r: order[(r["w"], r["h"], r["fleet"], r["strategy"])])
+        if out_path:
+            write_table(rows, out_path)
+        return rows
+
+
+def run_task(w: int, h: int, fleet: tuple, strats: tuple) -> list:
+    bf = _factories.get(w, h, fleet)
+    rows = []
+    for strat in strats:
+        start = time.perf_counter()
+        results = ResultsCollector()
+        for i, board in enumerate(bf.default_boards):
+            bg = play_board(bf, board, strat, seed=board_seed(EXPERIMENT_SEED, i))
+            results.add(i, bg.guesses, bg.achieved_hits)
+        summary = results.summary()
+        rows.append({
+            "w": w, "h": h, "fleet": fleet, "strategy": strat, "boards": summary["n"],
+            "mean": summary["mean"], "std": summary["std"], "median": summary["median"],
+            "p90": summary["p90"], "max": summary["max"], "worst_index": summary["worst_index"],
+            "seconds": time.perf_counter() - start,
+        })
+    return rows
+
+
+def write_table(rows: list, path: str) -> None:
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            row = dict(row)
+            row["fleet"] = fleet_name(row["fleet"])
+            row["strategy"] = STRATEGY_NAMES.get(row["strategy"], row["strategy"])
+            writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep experiments over a configuration matrix")
+    parser.add_argument("--widths", type=int, nargs="+", required=True)
+    parser.add_argument("--heights", type=int, nargs="+", required=True)
+    parser.add_argument("--fleets", nargs="+", required=True, help='comma separated, e.g. "2,3" "2,3,4"')
+    parser.add_argument("--strategies", type=int, nargs="+", default=[0, 1, 4])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-boards", type=int, default=None, help="skip configurations with more boards")
+    parser.add_argument("--out", default="sweep.csv")
+    args = parser.parse_args()
+
+    fleets = [tuple(int(s) for s in f.split(",")) for f in args.fleets]
+    scheduler = SweepScheduler(sweep_jobs(args.widths, args.heights, fleets, args.strategies),
+                               args.workers, args.max_boards)
+    for job in scheduler.skipped:
+        print("Skipping", job)
+    print(f"{len(scheduler.tasks)} tasks on {scheduler.workers} workers")
+    rows = scheduler.run(args.out)
+    for row in rows:
+        print(f'{row["w"]}x{row["h"]} {row["fleet"]} {STRATEGY_NAMES.get(row["strategy"])}: '
+              + f'mean {row["mean"]:.3f} max {row["max"]} ({row["seconds"]:.1f}s)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import struct
+
+# One record per guess: board index, guessed square, flags
+TRACE_RECORD = struct.Struct('<IHB')
+TRACE_HIT = 1
+# set on the first guess of each game, so repeated games of one board stay apart
+TRACE_FIRST = 2
+TRACE_BUFFER_RECORDS = 4096
+
+TRACE_PATH_DEFAULT = os.path.join(os.path.expanduser("~"), ".bship", "last.trace")
+
+
+class TraceWriter:
+    """
+    Appends every guess of an experiment to a compact binary trace file, for later replay
+    Records are packed into an in-memory buffer and written out a block at a time, so recording
+        costs far less than emitting a Qt signal per guess.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.out = open(path, 'ab' if append else 'wb')
+        self.buffer = bytearray()
+        self.pending = 0
+
+    def record(self, board_index: int, guess: int, hit: bool, first: bool = False) -> None:
+        flags = (TRACE_HIT if hit else 0) | (TRACE_FIRST if first else 0)
+        self.buffer += TRACE_RECORD.pack(board_index, guess, flags)
+        self.pending += 1
+        if self.pending >= TRACE_BUFFER_RECORDS:
+            self.flush()
+
+    def record_game(self, board_index: int, events: list) -> None:
+        """
+        Record a whole game's (guess, hit) events at once
+        """
+        for n, (guess, hit) in enumerate(events):
+            self.record(board_index, guess, hit, n == 0)
+
+    def flush(self) -> None:
+        if self.buffer:
+            self.out.write(self.buffer)
+            self.buffer = bytearray()
+            self.pending = 0
+        self.out.flush()
+
+    def close(self) -> None:
+        if self.out:
+            self.flush()
+            self.out.close()
+            self.out = None
+
+
+class TraceReader:
+    """
+    Random access to the games of a trace file, by board index
+    The file is scanned once to find where each board's run of records starts. If a board was
+        played more than once (a resumed or sampled experiment), its last game is the one replayed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # board index -> (first record, number of records)
+        self.index = {}
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.n_records = len(data) // TRACE_RECORD.size
+        self.data = data[:self.n_records * TRACE_RECORD.size]
+
+        current, start = None, 0
+        for r, (board_index, _, flags) in enumerate(TRACE_RECORD.iter_unpack(self.data)):
+            if board_index != current or flags & TRACE_FIRST:
+                if current is not None:
+                    self.index[current] = (start, r - start)
+                current, start = board_index, r
+        if current is not None:
+            self.index[current] = (start, self.n_records - start)
+
+    def boards(self) -> list:
+        return sorted(self.index)
+
+    def events(self, board_index: int) -> list:
+        """
+        The (guess, hit) events of a board's game, in order (empty if it wasn't recorded)
+        """
+        if board_index not in self.index:
+            return []
+        start, count = self.index[board_index]
+        chunk = self.data[start * TRACE_RECORD.size:(start + count) * TRACE_RECORD.size]
+        return [(guess, bool(flags & TRACE_HIT)) for _, guess, flags in TRACE_RECORD.iter_unpack(chunk)]
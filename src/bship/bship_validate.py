@@ -0,0 +1,405 @@
+"""
+Differential validation: checks a belief engine against the reference implementation
+
+A reference engine and a candidate engine play the same boards with the same seeds in lockstep.
+Before every guess their probability maps, chosen guesses and win detection are compared, and at
+the end their scores; the first divergence is reported with the trace that led to it.
+
+    python bship_validate.py --width 5 --height 5 --fleet 2 3 4 --candidate bitset --boards 200
+    python bship_validate.py --width 5 --height 5 --fleet 2 3 4 --results exp.results
+
+Engines are belief backends by name (see bship_backends.py), "memo" (the default backend with a
+BeliefMemo shared between games), "counting" (CountingBShipGame, which enumerates nothing) or
+"filter" (ReferenceGame, the default reference). Each engine gets its own BeliefCache over a
+shared BoardIndex, so neither can read the other's cached beliefs. Boards are drawn at random
+when only some are checked, and from a BoardSampler when no engine needs the enumeration, so
+large configurations can be checked with the counting engine.
+"""
+import argparse
+from random import Random
+
+from bship_backends import BITSET, available_backends
+from bship_board_factory import BoardFactory
+from bship_counting import CountingBShipGame, PlacementCounter
+from bship_experiment import EXPERIMENT_SEED, STRATEGY_NAMES, BeliefMemo, strategy_won
+from bship_factory_cache import FactoryCache
+from bship_game import BShipGame, board_seed
+from bship_hunt_target import HUNT_TARGET
+from bship_monte_carlo import BoardSampler
+from bship_placements import fleet_cells
+from bship_results import read_results
+
+# Filtering and counting the boards by brute force: shares no code with BShipGame's engines
+FILTER_ENGINE = "filter"
+REFERENCE_ENGINE = FILTER_ENGINE
+MEMO_ENGINE = "memo"
+COUNTING_ENGINE = "counting"
+
+VALIDATE_BOARDS_DEFAULT = 100
+
+# Strategies guided by the probabilities; Rand computes none and RandFast's are placeholders
+PROBABILITY_STRATEGIES = (0, 1, 4)
+
+# Largest difference between two probabilities (in percent) still counted as agreement; engines
+#     compute probabilities by the same expression, so they should agree exactly
+PROB_TOLERANCE = 0.0
+
+
+def engine_names() -> list:
+    return available_backends() + [MEMO_ENGINE, COUNTING_ENGINE, FILTER_ENGINE]
+
+
+def reference_orientations(ship) -> list:
+    """
+    A ship's orientations as lists of (x, y) cells from the top left of their bounding box: a
+        straight ship lies across or down (both, for length 1), a shape is turned a quarter at a time
+    """
+    if isinstance(ship, int):
+        return [[(i, 0) for i in range(ship)], [(0, i) for i in range(ship)]]
+    orientations = []
+    cells = [tuple(c) for c in ship]
+    for _ in range(4):
+        min_x = min(x for x, _ in cells)
+        min_y = min(y for _, y in cells)
+        cells = [(x - min_x, y - min_y) for x, y in cells]
+        if not any(set(cells) == set(o) for o in orientations):
+            orientations.append(cells)
+        cells = [(y, -x) for x, y in cells]
+    return orientations
+
+
+def reference_fits(w: int, h: int, ship, board: list, no_touch: bool = False) -> list:
+    """
+    Every placement of a ship (as a list of squares) which is in bounds and clear of the board
+        (and, with no_touch, of every square next to it, diagonals included)
+    """
+    taken = set(board)
+    if no_touch:
+        for c in board:
+            x, y = c % w, c // w
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if 0 <= x + dx < w and 0 <= y + dy < h:
+                        taken.add(c + dx + dy * w)
+
+    fits = []
+    for root in range(w * h):
+        x, y = root % w, root // w
+        for cells in reference_orientations(ship):
+            if not all(x + dx < w and y + dy < h for dx, dy in cells):
+                continue
+            fit = [root + dx + dy * w for dx, dy in cells]
+            if not any(c in taken for c in fit):
+                fits.append(fit)
+    return fits
+
+
+def reference_boards(w: int, h: int, ship_descr: tuple, no_touch: bool = False) -> list:
+    """
+    Every board of a configuration, generated the original way: each ship is tried at every
+        square, in every orientation, on every board of the ships before it
+    Shares no code with BoardIndex's placement masks, so the reference can catch their bugs.
+    """
+    boards = [[]]
+    for ship in ship_descr:
+        boards = [board + fit for board in boards for fit in reference_fits(w, h, ship, board, no_touch)]
+    return boards
+
+
+class ReferenceGame:
+    """
+    A Battleship game played by brute force, as the yardstick for the belief engines
+    The boards consistent with the trace are filtered from its own enumeration (see
+        reference_boards()) after each guess, and each square's probability is the fraction of
+        them containing it. There is no belief backend, miss cache, memo or guess queue: guesses
+        are chosen by scanning the squares, and random strategies draw from the same seeded
+        generator as BShipGame.
+    """
+
+    def __init__(self, ships: list, w: int, h: int, ship_descr: tuple, boards: list, strategy: int = 0,
+                 seed=None):
+        self.ships = ships
+        self.w = w
+        self.h = h
+        self.shipdescr = ship_descr
+        self.strategy = strategy
+        self.trace = {}
+        self.guesses = 0
+        self.achieved_hits = 0
+        self.rng = Random(seed)
+        # squares not yet guessed, kept in the same order as BShipGame's pool so Rand draws alike
+        self.unguessed = list(range(w * h))
+        self.candidates = [frozenset(board) for board in boards]
+        self.prob_beliefs = {}
+        self.count_beliefs()
+
+    def count_beliefs(self) -> None:
+        counts = [0] * (self.w * self.h)
+        for board in self.candidates:
+            for g in board:
+                counts[g] += 1
+        n = len(self.candidates)
+        self.prob_beliefs = {g: (counts[g] / n) * 100 for g in range(self.w * self.h)}
+
+    def real_hit(self, coord: int) -> bool:
+        hit = coord in self.ships
+        if coord not in self.trace:
+            i = self.unguessed.index(coord)
+            last = self.unguessed.pop()
+            if last != coord:
+                self.unguessed[i] = last
+        self.trace[coord] = hit
+        self.guesses += 1
+        if hit:
+            self.achieved_hits += 1
+        if self.strategy != 3:
+            self.candidates = [board for board in self.candidates if (coord in board) == hit]
+            self.count_beliefs()
+        return hit
+
+    def get_best_guess(self) -> int:
+        if self.strategy == 2:
+            return self.unguessed[self.rng.randrange(len(self.unguessed))]
+        if self.strategy == 3:
+            return self.rng.randrange(self.w * self.h)
+        best_g = -1
+        if self.strategy == 0:
+            best_q = 50
+            for g, p in self.prob_beliefs.items():
+                if abs(p - 50) < best_q:
+                    best_q, best_g = abs(p - 50), g
+        elif self.strategy == 1:
+            best_q = -1
+            for g, p in self.prob_beliefs.items():
+                if best_q < p < 100:
+                    best_q, best_g = p, g
+        elif self.strategy == 4:
+            best_q = 100
+            for g, p in self.prob_beliefs.items():
+                if best_q > p > 0:
+                    best_q, best_g = p, g
+        return best_g
+
+    def detect_il_win(self) -> bool:
+        return all(p in (0, 100) for p in self.prob_beliefs.values())
+
+    def detect_hit_win(self) -> bool:
+        return sum(self.trace.values()) == fleet_cells(self.shipdescr)
+
+
+class Divergence:
+    """
+    The first point at which two engines disagreed on a board
+    """
+
+    def __init__(self, board_index: int, board: list, step: int, what: str, reference, candidate,
+                 trace: list):
+        self.board_index = board_index
+        self.board = board
+        self.step = step
+        self.what = what
+        self.reference = reference
+        self.candidate = candidate
+        # (square, hit) pairs guessed before the divergence
+        self.trace = trace
+
+    def report(self) -> str:
+        lines = [f"Board {self.board_index} {sorted(self.board)}: {self.what} differs after {self.step} guesses",
+                 f"    reference: {self.reference}",
+                 f"    candidate: {self.candidate}",
+                 "Trace:"]
+        lines += [f"    {n + 1:3d}. {coord:4d} {'hit' if hit else 'miss'}" for n, (coord, hit) in enumerate(self.trace)]
+        return "\n".join(lines)
+
+
+class DifferentialValidator:
+    """
+    Plays a reference and a candidate engine side by side on one configuration
+    """
+
+    def __init__(self, w: int, h: int, ship_descr: tuple, strat: int = 0, reference: str = REFERENCE_ENGINE,
+                 candidate: str = BITSET, no_touch: bool = False, seed=EXPERIMENT_SEED,
+                 tolerance: float = PROB_TOLERANCE, factories: FactoryCache = None):
+        if strat == HUNT_TARGET:
+            raise ValueError("HuntTarget has no beliefs to validate")
+        for engine in (reference, candidate):
+            if engine not in engine_names():
+                raise ValueError(f"Engine {engine!r} is not available")
+        self.w = w
+        self.h = h
+        self.shipdescr = tuple(ship_descr)
+        self.strat = strat
+        self.reference = reference
+        self.candidate = candidate
+        self.no_touch = no_touch
+        self.seed = seed
+        self.tolerance = tolerance
+        self.factories = factories or FactoryCache()
+
+        self.engine_factories = {}
+        self.memo = BeliefMemo()
+        self.counter = None
+        self.reference_boards = None
+
+        self.boards_checked = 0
+        self.steps_checked = 0
+
+    def needs_factory(self) -> bool:
+        return self.reference != COUNTING_ENGINE or self.candidate != COUNTING_ENGINE
+
+    def index_factory(self) -> BoardFactory:
+        return self.factories.get(self.w, self.h, self.shipdescr, self.no_touch)
+
+    def engine_factory(self, engine: str) -> BoardFactory:
+        """
+        A factory of the engine's own: the shared index, with a fresh cache
+        """
+        bf = self.engine_factories.get(engine)
+        if bf is None:
+            base = self.index_factory()
+            bf = BoardFactory(base.w, base.h, base.shipdescr, index=base.index)
+            self.engine_factories[engine] = bf
+        return bf
+
+    def new_game(self, engine: str, board: list, seed):
+        if engine == FILTER_ENGINE:
+            if self.reference_boards is None:
+                self.reference_boards = reference_boards(self.w, self.h, self.shipdescr, self.no_touch)
+            return ReferenceGame(board, self.w, self.h, self.shipdescr, self.reference_boards, self.strat, seed)
+        if engine == COUNTING_ENGINE:
+            if self.counter is None:
+                self.counter = PlacementCounter(self.w, self.h, self.shipdescr, self.no_touch)
+            return CountingBShipGame(board, self.w, self.h, self.shipdescr, self.strat, self.counter, seed,
+                                     self.no_touch)
+        bf = self.engine_factory(engine)
+        if engine == MEMO_ENGINE:
+            return BShipGame(board, bf, self.strat, self.memo, seed)
+        return BShipGame(board, bf, self.strat, seed=seed, backend=engine)
+
+    def boards(self, n: int = None):
+        """
+        (index, board) pairs to check: every board, or n of them drawn at random
+        Without a factory, boards come from a BoardSampler and are indexed by draw.
+        """
+        rng = Random(self.seed)
+        if self.needs_factory():
+            boards = self.index_factory().default_boards
+            indices = range(len(boards)) if n is None else sorted(rng.sample(range(len(boards)), min(n, len(boards))))
+            for i in indices:
+                yield i, boards[i]
+        else:
+            sampler = BoardSampler(self.w, self.h, self.shipdescr, rng, self.no_touch)
+            for i in range(VALIDATE_BOARDS_DEFAULT if n is None else n):
+                yield i, sampler.random_board()
+
+    def compare_probabilities(self, ref: dict, cand: dict):
+        """
+        The first square whose probabilities differ, as (square, reference, candidate), or None
+        """
+        if self.strat not in PROBABILITY_STRATEGIES:
+            return None
+        for g in range(self.w * self.h):
+            p, q = ref.get(g), cand.get(g)
+            if p is None or q is None or abs(p - q) > self.tolerance:
+                return g, p, q
+        return None
+
+    def check_board(self, board_index: int, board: list):
+        """
+        Play both engines on a board; the first Divergence, or None if they agree throughout
+        """
+        seed = board_seed(self.seed, board_index)
+        ref = self.new_game(self.reference, board, seed)
+        cand = self.new_game(self.candidate, board, seed)
+        trace = []
+
+        def diverged(what, r, c):
+            return Divergence(board_index, board, len(trace), what, r, c, list(trace))
+
+        while True:
+            differs = self.compare_probabilities(ref.prob_beliefs, cand.prob_beliefs)
+            if differs is not None:
+                g, p, q = differs
+                return diverged(f"probability at square {g}", p, q)
+
+            ref_won, cand_won = strategy_won(ref, self.strat), strategy_won(cand, self.strat)
+            if ref_won != cand_won:
+                return diverged("win detection", ref_won, cand_won)
+            if ref_won:
+                break
+
+            g, cand_g = ref.get_best_guess(), cand.get_best_guess()
+            if g != cand_g:
+                return diverged("guess", g, cand_g)
+            hit = ref.real_hit(g)
+            cand.real_hit(g)
+            trace.append((g, hit))
+            self.steps_checked += 1
+
+        self.boards_checked += 1
+        if (ref.guesses, ref.achieved_hits) != (cand.guesses, cand.achieved_hits):
+            return diverged("score (guesses, hits)", (ref.guesses, ref.achieved_hits),
+                            (cand.guesses, cand.achieved_hits))
+        return None
+
+    def run(self, n: int = None):
+        """
+        Check n random boards (or every board); the first Divergence, or None
+        """
+        for i, board in self.boards(n):
+            divergence = self.check_board(i, board)
+            if divergence is not None:
+                return divergence
+        return None
+
+    def check_results(self, path: str):
+        """
+        Check the scores of a results file (e.g. from a sweep or a distributed run of this
+            configuration and strategy) against the reference engine; the first Divergence, or None
+        """
+        boards = self.index_factory().default_boards
+        for board_index, score, hits in read_results(path):
+            board = boards[board_index]
+            bg = self.new_game(self.reference, board, board_seed(self.seed, board_index))
+            trace = []
+            while not strategy_won(bg, self.strat):
+                g = bg.get_best_guess()
+                trace.append((g, bg.real_hit(g)))
+            self.boards_checked += 1
+            if (bg.guesses, bg.achieved_hits) != (score, hits):
+                return Divergence(board_index, board, len(trace), "recorded score (guesses, hits)",
+                                  (bg.guesses, bg.achieved_hits), (score, hits), trace)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a belief engine against the reference engine")
+    parser.add_argument("--width", type=int, required=True)
+    parser.add_argument("--height", type=int, required=True)
+    parser.add_argument("--fleet", type=int, nargs="+", required=True)
+    parser.add_argument("--strategy", type=int, default=0)
+    parser.add_argument("--reference", default=REFERENCE_ENGINE, choices=engine_names())
+    parser.add_argument("--candidate", default=BITSET, choices=engine_names())
+    parser.add_argument("--boards", type=int, default=VALIDATE_BOARDS_DEFAULT,
+                        help="number of random boards to check (0 for every board)")
+    parser.add_argument("--no-touch", action="store_true", help="ships may not touch, even diagonally")
+    parser.add_argument("--results", default=None, help="check the scores of this results file instead")
+    args = parser.parse_args()
+
+    validator = DifferentialValidator(args.width, args.height, tuple(args.fleet), args.strategy,
+                                      args.reference, args.candidate, args.no_touch)
+    if args.results:
+        divergence = validator.check_results(args.results)
+    else:
+        divergence = validator.run(args.boards or None)
+
+    name = STRATEGY_NAMES.get(args.strategy, args.strategy)
+    if divergence is None:
+        print(f"{name}: no divergence in {validator.boards_checked} boards ({validator.steps_checked} guesses)")
+    else:
+        print(divergence.report())
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
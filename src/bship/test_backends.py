@@ -0,0 +1,41 @@
+from random import Random
+
+from bship_backends import BitsetBackend, PythonSetBackend
+from bship_board_factory import BoardFactory
+
+# A million-board state: listing its boards one bit at a time copied the state once per board and
+#     took minutes, so a regression shows as this test hanging rather than as a timing failure
+LARGE_BOARDS = 1 << 20
+
+
+def test_bitset_indices_match_sets():
+    bf = BoardFactory(5, 5, (2, 3))
+    bits, sets = BitsetBackend(bf), PythonSetBackend(bf)
+    b_state, s_state = bits.initialize(), sets.initialize()
+    for coord, hit in ((12, True), (0, False), (13, False)):
+        b_state = bits.observe(b_state, coord, hit)
+        s_state = sets.observe(s_state, coord, hit)
+    assert bits.indices(b_state) == sorted(s_state)
+    assert list(bits.iter_indices(b_state)) == sorted(s_state)
+
+
+def test_bitset_indices_of_a_large_mask():
+    backend = BitsetBackend(BoardFactory(3, 3, (2,)))
+    # every other board survives
+    state = int.from_bytes(b"\x55" * (LARGE_BOARDS // 8), "little")
+
+    assert backend.indices(state) == list(range(0, LARGE_BOARDS, 2))
+    assert list(backend.iter_indices(state)) == list(range(0, LARGE_BOARDS, 2))
+
+
+def test_sample_draws_distinct_boards_of_the_state():
+    bf = BoardFactory(5, 5, (2, 3))
+    for backend in (BitsetBackend(bf), PythonSetBackend(bf)):
+        everything = backend.initialize()
+        # a large state is sampled by rejection, a small one by a pass over its boards
+        few = backend.observe(backend.observe(everything, 12, True), 13, True)
+        for state in (everything, few):
+            members = set(backend.indices(state))
+            sample = backend.sample(state, 20, Random(0))
+            assert len(sample) == min(20, len(members)) == len(set(sample))
+            assert set(sample) <= members
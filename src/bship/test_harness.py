@@ -4,6 +4,8 @@ from bship_game import BShipGame as bg
 
 from random import randint
 
+from bship_sampling import SequentialSampler, compare_strategies
+
 class TestHarness:
 
     # Board dimensions and ship description
@@ -62,6 +64,30 @@ class TestHarness:
         print("Mean number of guesses:",
               round((sum(performance_list)/len(performance_list)),2))
 
+    def test_sampled(self, width, height, shipdescr, precision=0.1, strategy=0, seed=None):
+        """
+        Estimate the mean number of guesses from random boards, stopping at the target precision
+        """
+        print(f'Sampling with w={width},h={height},ships={shipdescr},'
+              +f'precision={precision},strat={strategy}')
+
+        factory = bf(width,height,shipdescr)
+        sampler = SequentialSampler(factory, strategy, precision, seed=seed)
+        results = sampler.run()
+        lo, hi = sampler.interval()
+        print(f'{results.n} of {len(factory.default_boards)} boards sampled.')
+        print(f'Mean number of guesses: {results.mean:.2f} (95% CI {lo:.2f} - {hi:.2f})')
+
+    def test_compare(self, width, height, shipdescr, strategy_a=0, strategy_b=1, seed=None):
+        """
+        Sample boards until the better of two strategies is statistically settled
+        """
+        factory = bf(width,height,shipdescr)
+        outcome = compare_strategies(factory, strategy_a, strategy_b, seed=seed)
+        lo, hi = outcome["interval"]
+        print(f'{outcome["diff"].n} boards compared. Mean difference {outcome["diff"].mean:.2f} '
+              +f'(95% CI {lo:.2f} - {hi:.2f}). Verdict: {outcome["verdict"]}')
+
 
 harness = TestHarness()
 # Do a basic test of the game/generation logic to make sure things appear ok